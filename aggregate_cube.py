@@ -0,0 +1,139 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from cleaned_io import iter_cleaned, required_columns, one_hot_labels, cleaned_stamp
+
+# Default location of the cube
+cube_path = "aggregate_cube.parquet"
+
+# Dimensions of the cube and the cleaned columns each one is decoded from
+dimension_columns = {
+    'State': [col for col in required_columns if col.startswith('State_')],
+    'WindDir': [col for col in required_columns if col.startswith('WindDir_')],
+    'Weather': [col for col in required_columns if col.startswith('Weather_')],
+    'Day': [col for col in required_columns if col.startswith('Day_')],
+    'Holiday': ['Holiday']
+}
+dimensions = list(dimension_columns)
+
+# Measures stored as count, sum and sum of squares per cell
+measures = ['Affected_Time', 'Affected_Distance']
+
+# Cleaned columns read to build the cube
+cube_columns = [col for columns in dimension_columns.values() for col in columns] + measures
+
+# Dimension labels and measure terms of every row of a cleaned chunk
+def chunk_cells(chunk):
+    cells = pd.DataFrame({
+        dimension: one_hot_labels(chunk, columns) for dimension, columns in dimension_columns.items()
+        if dimension != 'Holiday'
+    })
+    cells['Holiday'] = chunk['Holiday'].to_numpy().astype(np.int64)
+    for measure in measures:
+        values = chunk[measure].to_numpy(dtype=np.float64)
+        cells[f"{measure}_Sum"] = values
+        cells[f"{measure}_SumSq"] = values * values
+    return cells
+
+# Aggregate the cleaned dataset into one row per non-empty cell in a single chunked pass
+def build_cube(chunks):
+    cube = None
+    for chunk in chunks:
+        grouped = chunk_cells(chunk).groupby(dimensions, sort=False)
+        sums = grouped.sum()
+        sums.insert(0, 'Count', grouped.size())
+        cube = sums if cube is None else cube.add(sums, fill_value=0)
+    # An input without rows gives a cube without cells
+    if cube is None:
+        return pd.DataFrame({**{dimension: pd.Series(dtype=np.int64 if dimension == 'Holiday' else object)
+                                for dimension in dimensions},
+                             'Count': pd.Series(dtype=np.int64),
+                             **{f"{measure}_{term}": pd.Series(dtype=np.float64)
+                                for measure in measures for term in ('Sum', 'SumSq')}})
+    cube['Count'] = cube['Count'].astype(np.int64)
+    return cube.sort_index().reset_index()
+
+class AggregateCube:
+    """Count, sum and sum of squares of the measures per State x WindDir x Weather x Day x Holiday cell.
+
+    source_stamp identifies the cleaned output the cube was built from (see cleaned_io.cleaned_stamp) and
+    is kept in the Parquet file's metadata.
+    """
+
+    def __init__(self, cells, source_stamp=None):
+        self.cells = cells
+        self.source_stamp = source_stamp
+
+    @classmethod
+    def load(cls, path=cube_path):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        source_stamp = (table.schema.metadata or {}).get(b'source_stamp')
+        return cls(table.to_pandas(), source_stamp.decode() if source_stamp is not None else None)
+
+    def save(self, path=cube_path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(self.cells, preserve_index=False)
+        if self.source_stamp is not None:
+            table = table.replace_schema_metadata({**table.schema.metadata, b'source_stamp': self.source_stamp.encode()})
+        pq.write_table(table, path)
+
+    def rollup(self, by=(), **filters):
+        """Count, mean and standard deviation of the measures grouped by the dimensions in `by`,
+        over the cells matching the filters, e.g. rollup(['State'], State=['LA', 'SC'])"""
+        cells = self.cells
+        for dimension, values in filters.items():
+            if dimension not in dimensions:
+                raise ValueError(f"Unknown dimension: {dimension}")
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            cells = cells[cells[dimension].isin(values)]
+
+        by = list(by)
+        totals = cells.groupby(by).sum(numeric_only=True) if by else cells.sum(numeric_only=True).to_frame('(all)').T
+        result = pd.DataFrame({'Count': totals['Count'].astype(np.int64)}, index=totals.index)
+        for measure in measures:
+            count = totals['Count'].astype(np.float64)
+            mean = totals[f"{measure}_Sum"] / count
+            variance = (totals[f"{measure}_SumSq"] - count * mean * mean) / (count - 1)
+            result[f"{measure}_Mean"] = mean
+            result[f"{measure}_Std"] = np.sqrt(variance.clip(lower=0))
+        return result
+
+# Load the cube, (re)building it from the cleaned dataset first when it does not exist or was built from
+# an earlier cleaning run's output
+def load_or_build_cube(path=cube_path, chunk_size=100000):
+    source_stamp = cleaned_stamp()
+    if os.path.exists(path):
+        cube = AggregateCube.load(path)
+        if cube.source_stamp == source_stamp:
+            return cube
+    cube = AggregateCube(build_cube(iter_cleaned(columns=cube_columns, chunk_size=chunk_size)), source_stamp)
+    cube.save(path)
+    return cube
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the aggregate cube of the cleaned dataset.")
+    parser.add_argument('--input', default=None, help="Cleaned CSV file or Parquet dataset")
+    parser.add_argument('--output', default=cube_path)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+
+    cube = AggregateCube(build_cube(iter_cleaned(columns=cube_columns, path=args.input, chunk_size=args.chunk_size)),
+                         cleaned_stamp(args.input))
+    cube.save(args.output)
+    print(f"Cube cells: {len(cube.cells)} covering {cube.cells['Count'].sum()} rows")
+
+    end_time = time.time()
+    print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
+
+if __name__ == "__main__":
+    main()
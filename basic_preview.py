@@ -1,24 +1,55 @@
+import argparse
 import csv
+from cleaned_io import default_cleaned_path, is_parquet
+from csv_scan import count_csv_records
 
-with open("us_accidents_sample_cleaned.csv", "r") as file:
-    reader = csv.reader(file)
-    
-    # Get columns (first row in the file)
-    columns = next(reader)
-    
-    # Get first data row (second row in the file)
-    first_data_row = next(reader)
-    
-    # Count remaining rows, adding 1 to include the first data row
-    row_count = 1 + sum(1 for _ in file)
-
-# Create a dictionary for the first data row
-first_data_dict = dict(zip(columns, first_data_row))
-
-# Print results
-print("Columns:", columns)
-print("Number of rows:", row_count)
-print("Number of columns:", len(columns))
-print("First data row (as dictionary):")
-for column, value in first_data_dict.items():
-    print(f'"{column}": [{value}],')
+# Column names and first record of a CSV file, parsed with the csv module so quoted fields are handled
+def read_csv_head(path):
+    with open(path, "r", newline="") as file:
+        reader = csv.reader(file)
+        columns = next(reader)
+        first_data_row = next(reader, [])
+    return columns, first_data_row
+
+# Row count and schema come from the Parquet metadata; only the first row is decoded
+def inspect_parquet(path):
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(path, format="parquet")
+    columns = dataset.schema.names
+    row_count = dataset.count_rows()
+    first_data_row = [str(value) for value in dataset.head(1).to_pylist()[0].values()] if row_count else []
+    return columns, row_count, first_data_row
+
+def inspect_csv(path, threads=None):
+    columns, first_data_row = read_csv_head(path)
+    row_count = max(count_csv_records(path, threads=threads) - 1, 0)
+    return columns, row_count, first_data_row
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Show the shape and first record of the cleaned dataset.")
+    parser.add_argument('--path', default=None, help="Cleaned CSV file or Parquet dataset")
+    parser.add_argument('--threads', type=int, default=None, help="Threads scanning the CSV (default: CPU count)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    path = args.path or default_cleaned_path()
+
+    if is_parquet(path):
+        columns, row_count, first_data_row = inspect_parquet(path)
+    else:
+        columns, row_count, first_data_row = inspect_csv(path, threads=args.threads)
+
+    # Create a dictionary for the first data row
+    first_data_dict = dict(zip(columns, first_data_row))
+
+    # Print results
+    print("Columns:", columns)
+    print("Number of rows:", row_count)
+    print("Number of columns:", len(columns))
+    print("First data row (as dictionary):")
+    for column, value in first_data_dict.items():
+        print(f'"{column}": [{value}],')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import os
+import glob
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from cleaning_manifest import load_manifest, prefix_fingerprint, write_json_atomic
+
+# Default locations of the cleaned dataset
+cleaned_csv_path = "us_accidents_sample_cleaned.csv"
+cleaned_parquet_path = "us_accidents_sample_cleaned.parquet"
+cleaned_store_path = "us_accidents_sample_cleaned.store"
+
+# Full list of required columns
+required_columns = [
+    'Affected_Distance', 'Affected_Time', 'Source', 'Latitude', 'Longitude',
+    'Temperature', 'Humidity', 'Pressure', 'Visibility', 'Wind_Speed', 'Precipitation',
+    'Amenity', 'Bump', 'Crossing', 'Give_Way', 'Junction', 'No_Exit', 'Railway',
+    'Roundabout', 'Station', 'Stop', 'Traffic_Calming', 'Traffic_Signal', 'Sunrise_Sunset',
+    'Civil_Twilight', 'Nautical_Twilight', 'Astronomical_Twilight', 'Percentage_of_Year',
+    'Percentage_of_Day', 'Holiday', 'After_Holiday',
+
+    # State columns - includes DC; excludes HI/AK
+    *['State_' + state for state in ['AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL',
+                                     'GA', 'IA', 'ID', 'IL', 'IN', 'KS', 'KY', 'LA', 'MA',
+                                     'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE',
+                                     'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI',
+                                     'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA', 'WI', 'WV', 'WY']],
+
+    # Wind direction columns
+    'WindDir_N', 'WindDir_E', 'WindDir_S', 'WindDir_W', 'WindDir_Calm', 'WindDir_Variable',
+
+    # Weather condition columns
+    'Weather_Clear', 'Weather_Cloudy', 'Weather_Fog', 'Weather_Heavy Rain', 'Weather_Light Rain',
+    'Weather_Rain', 'Weather_Snow',
+
+    # Day columns
+    'Day_Monday', 'Day_Tuesday', 'Day_Wednesday', 'Day_Thursday', 'Day_Friday',
+    'Day_Saturday', 'Day_Sunday'
+]
+
+# Targets and columns that are not model inputs
+target_columns = ['Affected_Distance', 'Affected_Time']
+feature_columns = [col for col in required_columns if col not in target_columns + ['Source']]
+
+# Feature names of a trained booster. A booster saved without them was trained on the feature_columns
+# of a cleaned matrix, in that order, so its features are named by position
+def model_feature_names(model):
+    if model.feature_names is not None:
+        return list(model.feature_names)
+    if model.num_features() != len(feature_columns):
+        raise ValueError(f"The model has {model.num_features()} unnamed features, not the {len(feature_columns)} "
+                         "feature columns of the cleaned data")
+    return list(feature_columns)
+
+# Continuous columns are stored as float32; every other column is a 0/1 flag stored as uint8
+continuous_columns = [
+    'Affected_Distance', 'Affected_Time', 'Latitude', 'Longitude', 'Temperature', 'Humidity',
+    'Pressure', 'Visibility', 'Wind_Speed', 'Precipitation', 'Percentage_of_Year', 'Percentage_of_Day'
+]
+compact_dtypes = {col: (np.float32 if col in continuous_columns else np.uint8) for col in required_columns}
+
+# Category label of every row of a one-hot group ('NA' when no column is set)
+def one_hot_labels(chunk, columns):
+    values = chunk[columns].to_numpy()
+    labels = np.array([col.split('_', 1)[1] for col in columns], dtype=object)[values.argmax(axis=1)]
+    labels[values.max(axis=1) == 0] = 'NA'
+    return labels
+
+# Convert a cleaned chunk (string or numeric output mode) to the compact dtypes
+def to_compact_dtypes(chunk):
+    return pd.DataFrame({
+        col: pd.to_numeric(chunk[col]).astype(compact_dtypes[col]) for col in chunk.columns
+    }, index=chunk.index)
+
+# Write one cleaned chunk as a part file of a partitioned Parquet dataset
+def write_parquet_part(chunk, dataset_path, part_index):
+    os.makedirs(dataset_path, exist_ok=True)
+    part_path = os.path.join(dataset_path, f"part-{part_index:05d}.parquet")
+    to_compact_dtypes(chunk).to_parquet(part_path, index=False)
+    return part_path
+
+# Remove the part files of a previous run so a new run starts from an empty dataset
+def clear_parquet_dataset(dataset_path):
+    for part_path in glob.glob(os.path.join(dataset_path, "part-*.parquet")):
+        os.remove(part_path)
+
+def _sync_file(path):
+    with open(path, "rb+") as file:
+        os.fsync(file.fileno())
+
+class CleanedOutput:
+    """Writes cleaned chunks to the CSV or the Parquet dataset, and optionally the feature store.
+
+    Every chunk is synced to disk before write() returns, and state() describes the output written so
+    far with fingerprints. A writer created from such a state checks the fingerprints and cuts off
+    whatever was written after it, so an interrupted run can continue exactly where its state was taken,
+    and a run appending to the output of an earlier run starts from exactly what that run wrote.
+    """
+
+    def __init__(self, format='csv', feature_store=False, append=False, part_index=0, state=None,
+                 csv_path=cleaned_csv_path, parquet_path=cleaned_parquet_path, store_path=cleaned_store_path):
+        self.format = format
+        self.csv_path = csv_path
+        self.parquet_path = parquet_path
+        self.part_index = part_index
+        self.csv_header = not append
+        self.last_part = None
+
+        if state is not None:
+            self._restore(state)
+        elif format == 'parquet' and not append:
+            clear_parquet_dataset(parquet_path)
+        elif format == 'csv' and not append and os.path.exists(csv_path):
+            os.remove(csv_path)
+
+        store_rows = state['store_rows'] if state is not None else None
+        self.store_writer = FeatureStoreWriter(store_path, append=append, rows=store_rows) if feature_store else None
+
+    def _restore(self, state):
+        if self.format == 'csv':
+            csv_bytes = state['csv_bytes']
+            size = os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0
+            if size < csv_bytes or (csv_bytes > 0 and prefix_fingerprint(self.csv_path, csv_bytes) != state['fingerprint']):
+                raise ValueError(f"{self.csv_path} does not match its recorded state; rebuild the output")
+            if size > 0:
+                os.truncate(self.csv_path, csv_bytes)
+            self.csv_header = csv_bytes == 0
+        else:
+            self.part_index = state['part_index']
+            last_part = state['last_part']
+            if last_part is not None and (not os.path.exists(last_part) or
+                                          prefix_fingerprint(last_part, os.path.getsize(last_part)) != state['fingerprint']):
+                raise ValueError(f"{last_part} does not match its recorded state; rebuild the output")
+            # Parts numbered from the state on were written after it
+            for part_path in glob.glob(os.path.join(self.parquet_path, "part-*.parquet")):
+                if int(os.path.basename(part_path)[len("part-"):-len(".parquet")]) >= self.part_index:
+                    os.remove(part_path)
+            self.last_part = last_part
+
+    def write(self, chunk):
+        if self.format == 'parquet':
+            self.last_part = write_parquet_part(chunk, self.parquet_path, self.part_index)
+            _sync_file(self.last_part)
+        else:
+            with open(self.csv_path, "w" if self.csv_header else "a", newline="") as file:
+                chunk.to_csv(file, index=False, header=self.csv_header)
+                file.flush()
+                os.fsync(file.fileno())
+            self.csv_header = False
+        self.part_index += 1
+        if self.store_writer is not None:
+            self.store_writer.append(chunk)
+            self.store_writer.sync()
+
+    def state(self):
+        state = {'part_index': self.part_index,
+                 'store_rows': self.store_writer.rows if self.store_writer is not None else None}
+        if self.format == 'parquet':
+            state['last_part'] = self.last_part
+            state['fingerprint'] = (prefix_fingerprint(self.last_part, os.path.getsize(self.last_part))
+                                    if self.last_part is not None else None)
+        else:
+            csv_bytes = os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0
+            state['csv_bytes'] = csv_bytes
+            state['fingerprint'] = prefix_fingerprint(self.csv_path, csv_bytes) if csv_bytes else None
+        return state
+
+    def close(self):
+        if self.store_writer is not None:
+            self.store_writer.close()
+
+# The output written by the last cleaning run, as recorded in its manifest. A CSV run leaves an older Parquet
+# dataset in place (and the other way round), so which one exists says nothing about which one is current.
+# Without a manifest, the Parquet dataset when it has been written, otherwise the CSV.
+def default_cleaned_path():
+    manifest = load_manifest()
+    if manifest is not None:
+        return cleaned_parquet_path if manifest['settings']['format'] == 'parquet' else cleaned_csv_path
+    return cleaned_parquet_path if os.path.isdir(cleaned_parquet_path) else cleaned_csv_path
+
+# sha256 of the cleaned output: the contents of the CSV, or the names and contents of the Parquet part files
+def cleaned_fingerprint(path=None):
+    if path is None:
+        path = default_cleaned_path()
+    files = sorted(glob.glob(os.path.join(path, "part-*.parquet"))) if os.path.isdir(path) else [path]
+    digest = hashlib.sha256()
+    for file_path in files:
+        digest.update(os.path.basename(file_path).encode())
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+# Size and modification time of every file of the cleaned output: cheap to read, and changed by every
+# cleaning run that rewrites the output
+def cleaned_stamp(path=None):
+    if path is None:
+        path = default_cleaned_path()
+    files = sorted(glob.glob(os.path.join(path, "part-*.parquet"))) if os.path.isdir(path) else [path]
+    return json.dumps([[os.path.basename(file_path), os.stat(file_path).st_size, os.stat(file_path).st_mtime_ns]
+                       for file_path in files])
+
+def is_parquet(path):
+    return os.path.isdir(path) or path.endswith(".parquet")
+
+class FeatureStoreWriter:
+    """Appends cleaned chunks to a feature store directory: one raw C-order float32 file for the
+    feature matrix, one per target, and header.json with the row count and column order. The header
+    is replaced atomically and never counts rows that are not on disk, so a reader never maps a
+    missing row, and the rows a writer appends become visible when close() writes the new header.
+    """
+
+    def __init__(self, path=cleaned_store_path, append=False, rows=None):
+        """append continues after the rows of the existing header; rows continues after exactly that
+        many rows (used when resuming a run, or appending after the rows the last run recorded)"""
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        header = open_feature_store(path)[2] if has_feature_store(path) else None
+        if rows is None and append and header is not None:
+            if header['feature_columns'] != feature_columns:
+                raise ValueError(f"Feature store {path} has a different column order")
+            rows = header['rows']
+        self.rows = rows or 0
+        # Rows about to be cut off or overwritten leave the header first
+        if header is not None and header['rows'] > self.rows:
+            self._write_header(self.rows)
+        if rows is not None:
+            # Drop anything an unfinished earlier writer left after the rows that are kept
+            row_widths = {'features': len(feature_columns), **{col: 1 for col in target_columns}}
+            for name, width in row_widths.items():
+                file_path = os.path.join(path, f"{name}.f32")
+                kept_bytes = self.rows * width * 4
+                if not os.path.exists(file_path) or os.path.getsize(file_path) < kept_bytes:
+                    raise ValueError(f"{file_path} has fewer than the {self.rows} rows to continue after")
+                os.truncate(file_path, kept_bytes)
+        mode = "wb" if rows is None else "ab"
+        self.files = {name: open(os.path.join(path, f"{name}.f32"), mode) for name in ['features'] + target_columns}
+
+    def append(self, chunk):
+        compact = to_compact_dtypes(chunk[feature_columns + target_columns])
+        self.files['features'].write(np.ascontiguousarray(compact[feature_columns].to_numpy(dtype=np.float32)).tobytes())
+        for col in target_columns:
+            self.files[col].write(compact[col].to_numpy(dtype=np.float32).tobytes())
+        self.rows += len(chunk)
+
+    def sync(self):
+        """Make the rows appended so far durable"""
+        for file in self.files.values():
+            file.flush()
+            os.fsync(file.fileno())
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self._write_header(self.rows)
+
+    def _write_header(self, rows):
+        header = {'rows': rows, 'dtype': 'float32', 'feature_columns': feature_columns,
+                  'target_columns': target_columns}
+        write_json_atomic(header, os.path.join(self.path, "header.json"))
+
+def has_feature_store(path=cleaned_store_path):
+    return os.path.exists(os.path.join(path, "header.json"))
+
+# Whether the feature store holds the current cleaned data: a run without --feature-store leaves the store of an
+# earlier run behind, so the store only counts when the manifest of the last run says it was written
+def has_current_feature_store(path=cleaned_store_path):
+    manifest = load_manifest()
+    if manifest is not None and not manifest['settings']['feature_store']:
+        return False
+    return has_feature_store(path)
+
+# The data train_model.py trains on: the feature store when it is current, otherwise the cleaned output
+def training_data_path():
+    return cleaned_store_path if has_current_feature_store() else default_cleaned_path()
+
+# Memory-map a feature store: returns the (rows, features) matrix, a dict of target arrays and the header
+def open_feature_store(path=cleaned_store_path):
+    with open(os.path.join(path, "header.json")) as file:
+        header = json.load(file)
+
+    def mapped(name, shape):
+        if header['rows'] == 0:
+            return np.empty(shape, dtype=np.float32)
+        return np.memmap(os.path.join(path, f"{name}.f32"), dtype=np.float32, mode='r', shape=shape)
+
+    features = mapped('features', (header['rows'], len(header['feature_columns'])))
+    targets = {col: mapped(col, (header['rows'],)) for col in header['target_columns']}
+    return features, targets, header
+
+# Load the cleaned dataset, reading only the requested columns
+def read_cleaned(columns=None, path=None, nrows=None):
+    if path is None:
+        path = default_cleaned_path()
+
+    if is_parquet(path):
+        if nrows is not None:
+            import pyarrow.dataset as ds
+            return ds.dataset(path, format="parquet").head(nrows, columns=columns).to_pandas()
+        return pd.read_parquet(path, columns=columns)
+
+    return pd.read_csv(path, usecols=columns, nrows=nrows)
+
+# Stream the cleaned dataset in chunks of the requested columns
+def iter_cleaned(columns=None, path=None, chunk_size=100000):
+    if path is None:
+        path = default_cleaned_path()
+
+    if is_parquet(path):
+        import pyarrow.dataset as ds
+        for batch in ds.dataset(path, format="parquet").to_batches(columns=columns, batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
@@ -1,43 +1,31 @@
 import numpy as np
 import pandas as pd
 from workalendar.usa import UnitedStates
+import os
 import time
-import gc
-
-# Full list of required columns
-required_columns = [
-    'Affected_Distance', 'Affected_Time', 'Source', 'Latitude', 'Longitude', 
-    'Temperature', 'Humidity', 'Pressure', 'Visibility', 'Wind_Speed', 'Precipitation', 
-    'Amenity', 'Bump', 'Crossing', 'Give_Way', 'Junction', 'No_Exit', 'Railway', 
-    'Roundabout', 'Station', 'Stop', 'Traffic_Calming', 'Traffic_Signal', 'Sunrise_Sunset', 
-    'Civil_Twilight', 'Nautical_Twilight', 'Astronomical_Twilight', 'Percentage_of_Year', 
-    'Percentage_of_Day', 'Holiday', 'After_Holiday',
-    
-    # State columns - includes DC; excludes HI/AK
-    *['State_' + state for state in ['AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 
-                                     'GA', 'IA', 'ID', 'IL', 'IN', 'KS', 'KY', 'LA', 'MA', 
-                                     'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 
-                                     'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 
-                                     'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA', 'WI', 'WV', 'WY']],
-    
-    # Wind direction columns
-    'WindDir_N', 'WindDir_E', 'WindDir_S', 'WindDir_W', 'WindDir_Calm', 'WindDir_Variable',
-
-    # Weather condition columns
-    'Weather_Clear', 'Weather_Cloudy', 'Weather_Fog', 'Weather_Heavy Rain', 'Weather_Light Rain', 
-    'Weather_Rain', 'Weather_Snow',
-
-    # Day columns
-    'Day_Monday', 'Day_Tuesday', 'Day_Wednesday', 'Day_Thursday', 'Day_Friday', 
-    'Day_Saturday', 'Day_Sunday'
-]
+import argparse
+from collections import deque
+from multiprocessing import Pool
+from raw_io import read_raw, raw_sample_path, cleaning_columns
+from cleaning_manifest import (load_manifest, save_manifest, new_manifest, pending_sources, record_source, load_checkpoint,
+                               save_checkpoint, clear_checkpoint)
+from csv_scan import record_offset
+from cleaned_io import required_columns, CleanedOutput
+from stage_profiler import NullProfiler, StageProfiler, add_profile_args, profiler_from_args, finish_profile
+
+def process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_reverse_map, numeric_output=False,
+                  profiler=None):
+    # Every step ends with a hook that records its time, rows and memory when a StageProfiler is passed
+    if profiler is None:
+        profiler = NullProfiler()
+    profiler.start('chunk', len(chunk))
 
-def process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_reverse_map):
     # Step 1: Remove unnecessary columns
     columns_to_remove = ['ID', 'Severity', 'End_Lat', 'End_Lng', 'Description', 
                         'County', 'City', 'Zipcode', 'Country', 'Weather_Timestamp', 
                         'Timezone', 'Airport_Code', 'Wind_Chill(F)', 'Turning_Loop']
     chunk.drop(columns=[col for col in columns_to_remove if col in chunk.columns], inplace=True)
+    profiler.mark('Step 1: Remove unnecessary columns')
 
     # Step 2: Rename columns
     rename_columns = {
@@ -52,16 +40,22 @@ def process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_re
         'Precipitation(in)': 'Precipitation'
     }
     chunk.rename(columns=rename_columns, inplace=True)
+    profiler.mark('Step 2: Rename columns')
 
     # Step 3: Map and combine 'Weather_Condition' and 'Wind_Direction'
-    chunk['Wind_Direction'] = chunk['Wind_Direction'].map(wind_direction_map).fillna('')
-    chunk['Weather_Condition'] = chunk['Weather_Condition'].map(weather_condition_reverse_map).fillna('')
+    # The raw columns are read as categoricals; mapping a categorical whose categories all map gives another
+    # categorical, which cannot take the '' fill, so both are mapped as plain objects
+    chunk['Wind_Direction'] = chunk['Wind_Direction'].astype(object).map(wind_direction_map).fillna('')
+    chunk['Weather_Condition'] = chunk['Weather_Condition'].astype(object).map(weather_condition_reverse_map).fillna('')
+    profiler.mark('Step 3: Map wind and weather')
 
     # Step 4: Set 'Wind_Speed' to 0 where 'Wind_Direction' is 'Calm' and 'Wind_Speed' is blank
     chunk.loc[(chunk['Wind_Direction'] == 'Calm') & (chunk['Wind_Speed'].isna()), 'Wind_Speed'] = 0
+    profiler.mark('Step 4: Calm wind speed')
 
     # Step 5: Set 'Precipitation' to 0 where 'Weather_Condition' is 'Clear', 'Cloudy', or 'Fog' and 'Precipitation' is blank
     chunk.loc[(chunk['Weather_Condition'].isin(['Clear', 'Cloudy', 'Fog'])) & (chunk['Precipitation'].isna()), 'Precipitation'] = 0
+    profiler.mark('Step 5: Dry precipitation')
 
     # Step 6: Handle datetime columns and create 'Affected_Time'
     chunk['Start_Time'] = chunk['Start_Time'].str.split('.').str[0]
@@ -69,6 +63,7 @@ def process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_re
     chunk['Start_Time'] = pd.to_datetime(chunk['Start_Time'])
     chunk['End_Time'] = pd.to_datetime(chunk['End_Time'])
     chunk['Affected_Time'] = (chunk['End_Time'] - chunk['Start_Time']).dt.total_seconds()
+    profiler.mark('Step 6: Parse datetimes')
 
     # Step 7: Extract time-based columns
     chunk['Day_of_Month'] = chunk['Start_Time'].dt.day
@@ -77,32 +72,41 @@ def process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_re
     chunk['Hour_of_Day'] = chunk['Start_Time'].dt.hour
     chunk['Minute_of_Hour'] = chunk['Start_Time'].dt.minute
     chunk['Second_of_Minute'] = chunk['Start_Time'].dt.second
+    profiler.mark('Step 7: Time-based columns')
 
     # Step 8: Calculate 'Percentage_of_Year'
-    def percentage_of_year(row):
-        day_of_year = pd.Timestamp(year=row['Start_Time'].year, month=row['Month_of_Year'], day=row['Day_of_Month']).day_of_year
-        days_in_year = 366 if ((row['Start_Time'].year % 4 == 0) and (row['Start_Time'].year % 100 != 0 or row['Start_Time'].year % 400 == 0)) else 365
-        return day_of_year / days_in_year
-
-    chunk['Percentage_of_Year'] = chunk.apply(percentage_of_year, axis=1)
+    days_in_year = np.where(chunk['Start_Time'].dt.is_leap_year, 366, 365)
+    chunk['Percentage_of_Year'] = chunk['Start_Time'].dt.dayofyear / days_in_year
+    profiler.mark('Step 8: Percentage_of_Year')
 
     # Step 9: Calculate 'Percentage_of_Day'
-    def percentage_of_day(row):
-        total_seconds_in_day = 86400
-        seconds_in_day = (row['Hour_of_Day'] * 3600) + (row['Minute_of_Hour'] * 60) + row['Second_of_Minute']
-        return seconds_in_day / total_seconds_in_day
-
-    chunk['Percentage_of_Day'] = chunk.apply(percentage_of_day, axis=1)
+    total_seconds_in_day = 86400
+    seconds_in_day = (chunk['Hour_of_Day'] * 3600) + (chunk['Minute_of_Hour'] * 60) + chunk['Second_of_Minute']
+    chunk['Percentage_of_Day'] = seconds_in_day / total_seconds_in_day
+    profiler.mark('Step 9: Percentage_of_Day')
 
     # Step 10: Drop time-related columns
     chunk.drop(columns=['Day_of_Month', 'Month_of_Year', 'Hour_of_Day', 'Minute_of_Hour', 'Second_of_Minute'], inplace=True)
+    profiler.mark('Step 10: Drop time columns')
 
     # Step 11: Add 'Holiday' and 'After_Holiday' columns
-    chunk['Holiday'] = chunk['Start_Time'].apply(lambda x: x.date() in holidays_dict[x.year]).astype(int)
-    chunk['After_Holiday'] = chunk['Start_Time'].apply(lambda x: (x - pd.Timedelta(days=1)).date() in holidays_dict[x.year]).astype(int)
+    # Each row is looked up in the holiday array of its own Start_Time year (also for the previous day)
+    start_dates = chunk['Start_Time'].values.astype('datetime64[D]')
+    previous_dates = start_dates - np.timedelta64(1, 'D')
+    start_years = chunk['Start_Time'].dt.year.values
+    holiday = np.zeros(len(chunk), dtype=bool)
+    after_holiday = np.zeros(len(chunk), dtype=bool)
+    for year in np.unique(start_years):
+        in_year = start_years == year
+        holiday[in_year] = np.isin(start_dates[in_year], holidays_dict[year])
+        after_holiday[in_year] = np.isin(previous_dates[in_year], holidays_dict[year])
+    chunk['Holiday'] = holiday.astype(int)
+    chunk['After_Holiday'] = after_holiday.astype(int)
+    profiler.mark('Step 11: Holidays')
 
     # Step 12: Drop 'Start_Time' and 'End_Time'
     chunk.drop(columns=['Start_Time', 'End_Time'], inplace=True)
+    profiler.mark('Step 12: Drop Start_Time and End_Time')
 
     # Step 13: Set precision for numerical columns
     numeric_columns = {
@@ -121,32 +125,51 @@ def process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_re
 
     for col, decimals in numeric_columns.items():
         chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
-        formatter = "{{:.{}f}}".format(decimals)
-        chunk[col] = chunk[col].apply(lambda x: formatter.format(x).zfill(decimals + 2) if pd.notna(x) else None)
+        if numeric_output:
+            # Round in place and keep the column numeric (float64 where 6 decimals need the mantissa)
+            dtype = np.float64 if decimals >= 6 else np.float32
+            chunk[col] = np.round(chunk[col].to_numpy(dtype=np.float64), decimals).astype(dtype)
+        else:
+            formatter = "{{:.{}f}}".format(decimals)
+            chunk[col] = chunk[col].apply(lambda x: formatter.format(x).zfill(decimals + 2) if pd.notna(x) else None)
+    profiler.mark('Step 13: Numeric precision')
 
     # Step 14: One-hot-encode categorical columns
     day_of_week_map = {1: 'Monday', 2: 'Tuesday', 3: 'Wednesday', 4: 'Thursday', 5: 'Friday', 6: 'Saturday', 7: 'Sunday'}
     chunk['Day_of_Week'] = chunk['Day_of_Week'].map(day_of_week_map)
     chunk = pd.get_dummies(chunk, columns=['State', 'Wind_Direction', 'Weather_Condition', 'Day_of_Week'], prefix=['State', 'WindDir', 'Weather', 'Day'], drop_first=False)
+    profiler.mark('Step 14: One-hot encoding')
 
     # Convert boolean columns to 0 or 1
     chunk = chunk.apply(lambda x: x.map({True: 1, False: 0}) if x.dtype == bool else x)
+    profiler.mark('Booleans to 0/1')
 
     # Map day/night columns
     for col in ['Sunrise_Sunset', 'Civil_Twilight', 'Nautical_Twilight', 'Astronomical_Twilight']:
         chunk[col] = chunk[col].map({'Day': 1, 'Night': 0})
+    profiler.mark('Day/night columns')
 
     # Map 'Source' column
     chunk['Source'] = chunk['Source'].map({'Source1': 0, 'Source2': 1})
+    profiler.mark('Source')
 
     # Move 'Affected_Distance' and 'Affected_Time' to the leftmost columns
     cols = ['Affected_Distance', 'Affected_Time'] + [col for col in chunk.columns if col not in ['Affected_Distance', 'Affected_Time']]
     chunk = chunk[cols]
+    profiler.mark('Move targets left')
 
     # Remove rows with NaNs and drop 'Street' column
     chunk.replace(r'^\s*$', np.nan, regex=True, inplace=True)
+    profiler.mark('Blank strings to NaN')
     chunk.dropna(inplace=True)
     chunk.drop(columns=['Street'], inplace=True)
+    profiler.mark('Drop NaN rows and Street', len(chunk))
+
+    # In numeric mode the mapped columns hold no NaNs anymore, so store them as integers
+    if numeric_output:
+        for col in ['Source', 'Sunrise_Sunset', 'Civil_Twilight', 'Nautical_Twilight', 'Astronomical_Twilight']:
+            chunk[col] = chunk[col].astype(np.int64)
+        profiler.mark('Integer flag columns')
 
     # Enforce required columns
     for column in required_columns:
@@ -154,14 +177,116 @@ def process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_re
             chunk[column] = 0  # Default to 0 or a suitable value for missing columns
 
     chunk = chunk.reindex(columns=required_columns)
+    profiler.mark('Enforce required columns')
 
     return chunk[required_columns]  # Ensure the chunk has the exact columns in the correct order
 
+class HolidayDates(dict):
+    """Sorted datetime64[D] holiday arrays per year; a year that is not in the table yet is computed
+    from the calendar on first lookup, so records from new years need no configuration."""
+
+    def __init__(self, cal):
+        super().__init__()
+        self.cal = cal
+
+    def __missing__(self, year):
+        holidays_list = self.cal.holidays(int(year))
+        self[year] = np.array(sorted(set([holiday[0] for holiday in holidays_list])), dtype='datetime64[D]')
+        return self[year]
+
+# Pre-calculate holiday dates per year as sorted datetime64[D] arrays for vectorized lookups
+def build_holidays_dict(cal, start_year, end_year):
+    holidays_dict = HolidayDates(cal)
+    for year in range(start_year, end_year + 1):
+        holidays_dict.__missing__(year)
+    return holidays_dict
+
+# Lookup tables of a worker process, set once by the pool initializer instead of being pickled with every chunk
+_worker_tables = None
+
+def _init_worker(holidays_dict, wind_direction_map, weather_condition_reverse_map, numeric_output, profile_memory):
+    global _worker_tables
+    _worker_tables = (holidays_dict, wind_direction_map, weather_condition_reverse_map, numeric_output, profile_memory)
+
+# A profiled chunk comes back with the step records of its own profiler
+def _process_chunk_in_worker(chunk):
+    holidays_dict, wind_direction_map, weather_condition_reverse_map, numeric_output, profile_memory = _worker_tables
+    profiler = StageProfiler(profile_memory) if profile_memory is not False else None
+    processed_chunk = process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_reverse_map,
+                                    numeric_output=numeric_output, profiler=profiler)
+    return processed_chunk, profiler.records if profiler is not None else []
+
+# Clean chunks on a pool of worker processes and yield them in input order
+def process_chunks_parallel(chunks, workers, holidays_dict, wind_direction_map, weather_condition_reverse_map,
+                            numeric_output=False, max_in_flight=None, profiler=None):
+    if profiler is None:
+        profiler = NullProfiler()
+    # At most max_in_flight chunks are read ahead of the writer, which bounds memory use
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    pending = deque()
+    # Workers profile their chunks with the same memory measure and the records are merged here
+    profile_memory = profiler.memory if isinstance(profiler, StageProfiler) else False
+    initargs = (holidays_dict, wind_direction_map, weather_condition_reverse_map, numeric_output, profile_memory)
+    with Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        for chunk in chunks:
+            pending.append(pool.apply_async(_process_chunk_in_worker, (chunk,)))
+            if len(pending) >= max_in_flight:
+                processed_chunk, records = pending.popleft().get()
+                profiler.merge(records)
+                yield processed_chunk
+        while pending:
+            processed_chunk, records = pending.popleft().get()
+            profiler.merge(records)
+            yield processed_chunk
+
+# Byte offset of the record that follows `records` records from `offset`; a source read from offset 0 starts with its header
+def resume_offset(source, offset, records):
+    if records == 0:
+        return offset
+    return record_offset(source, offset, records + 1 if offset == 0 else records)
+
+# Chunks of every pending source in turn, reading from the given byte offsets up to the sizes the sources had
+# when the run started. The source and raw record count of every chunk are queued in read order.
+def read_pending_sources(offsets, source_sizes, chunk_size, engine, chunk_sources):
+    for source, offset in offsets:
+        if offset >= source_sizes[source]:
+            continue
+        for chunk in read_raw(source, columns=cleaning_columns, chunksize=chunk_size, engine=engine, offset=offset,
+                              end=source_sizes[source]):
+            chunk_sources.append((source, len(chunk)))
+            yield chunk
+
+# Command line options for a cleaning run
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean the sampled US Accidents CSV in chunks.")
+    parser.add_argument('--numeric', action='store_true',
+                        help="Keep rounded columns as floats instead of writing zero-padded strings")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes cleaning chunks in parallel (1 runs serially)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="Write a single CSV or a partitioned Parquet dataset with compact dtypes")
+    parser.add_argument('--engine', choices=['c', 'pyarrow'], default='c',
+                        help="CSV parser for the raw input (pyarrow parses with multiple threads)")
+    parser.add_argument('--feature-store', action='store_true',
+                        help="Also write the memory-mappable float32 feature store used for training")
+    parser.add_argument('--input', nargs='+', default=[raw_sample_path],
+                        help="Raw CSV files to clean, e.g. the monthly extracts")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Append only records that are not in the manifest of earlier runs to the existing output")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Ignore the checkpoint of an interrupted run and start the run over")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Raw records cleaned per chunk")
+    add_profile_args(parser, "cleaning_profile")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     start_time = time.time()
+    profiler = profiler_from_args(args)
     
     # Initialize constants and mappings as before
-    chunk_size = 100000
+    chunk_size = args.chunk_size
     start_year = 2015
     end_year = 2024
     
@@ -201,24 +326,80 @@ def main():
 
     weather_condition_reverse_map = {cond: key for key, cond_list in weather_condition_map.items() for cond in cond_list}
 
-    # Pre-calculate holidays using cal
-    holidays_dict = {}
-    for year in range(start_year, end_year + 1):
-        holidays_list = cal.holidays(year)
-        holidays_dict[year] = set([holiday[0] for holiday in holidays_list])
+    # Pre-calculate holidays using cal; years outside the range are added on their first lookup
+    holidays_dict = build_holidays_dict(cal, start_year, end_year)
     
-    # Process the file in chunks
-    first_chunk = True
-    for chunk in pd.read_csv("us_accidents_sample.csv", chunksize=chunk_size):
-        processed_chunk = process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_reverse_map)
-        
-        mode = 'w' if first_chunk else 'a'
-        header = first_chunk
-        processed_chunk.to_csv("us_accidents_sample_cleaned.csv", mode=mode, index=False, header=header)
-        first_chunk = False
-        
-        del processed_chunk
-        gc.collect()
+    # Settings the existing output was written with must match when appending to it
+    settings = {'format': args.format, 'numeric': args.numeric, 'feature_store': args.feature_store}
+    manifest = load_manifest() if args.incremental else None
+    appending = manifest is not None
+    if appending and manifest['settings'] != settings:
+        raise ValueError(f"The cleaned output was written with {manifest['settings']}; rerun with those options")
+    if not appending:
+        manifest = new_manifest(settings)
+
+    # Only the records added since the last run are read from sources that are already in the manifest
+    pending = pending_sources(manifest, args.input)
+    if not pending:
+        print("No new records to clean")
+        return
+    source_sizes = {source: os.path.getsize(source) for source, _ in pending}
+
+    # A checkpoint of an interrupted run over the same sources and offsets says how many raw records of
+    # each source are already in the output, and what the output looked like at that point
+    run = {'settings': settings, 'appending': appending,
+           'sources': [[source, offset, source_sizes[source]] for source, offset in pending]}
+    checkpoint = None if args.no_resume else load_checkpoint(run)
+    if checkpoint is not None:
+        print(f"Resuming after {checkpoint['chunks_done']} chunks of an interrupted run")
+        output_state = checkpoint['output']
+    else:
+        # An appending run starts from the output the last complete run left, cutting off whatever an
+        # interrupted run added after it (manifests of older runs did not record that state)
+        output_state = manifest.get('output') if appending else None
+    output = CleanedOutput(args.format, args.feature_store, append=appending, part_index=manifest['next_part'],
+                           state=output_state)
+    if checkpoint is None:
+        checkpoint = {'run': run, 'chunks_done': 0, 'records_done': {source: 0 for source, _ in pending},
+                      'output': output.state()}
+        save_checkpoint(checkpoint)
+    records_done = checkpoint['records_done']
+
+    # Seek past the records that are already cleaned instead of parsing them again
+    offsets = [(source, resume_offset(source, offset, records_done[source])) for source, offset in pending]
+
+    # Process the files in chunks
+    chunk_sources = deque()
+    chunks = read_pending_sources(offsets, source_sizes, chunk_size, args.engine, chunk_sources)
+    if args.workers > 1:
+        processed_chunks = process_chunks_parallel(chunks, args.workers, holidays_dict, wind_direction_map,
+                                                   weather_condition_reverse_map, numeric_output=args.numeric,
+                                                   profiler=profiler)
+    else:
+        processed_chunks = (process_chunk(chunk, holidays_dict, wind_direction_map, weather_condition_reverse_map,
+                                          numeric_output=args.numeric, profiler=profiler) for chunk in chunks)
+
+    # Chunks come back in read order, so after each write the checkpoint covers a prefix of every source
+    for processed_chunk in processed_chunks:
+        source, raw_records = chunk_sources.popleft()
+        output.write(processed_chunk)
+        profiler.mark('Write output')
+        records_done[source] += raw_records
+        checkpoint['chunks_done'] += 1
+        checkpoint['output'] = output.state()
+        save_checkpoint(checkpoint)
+        profiler.mark('Save checkpoint')
+    output.close()
+
+    # New parts of later runs are numbered after the parts of this one, and appending runs start from this output
+    manifest['next_part'] = output.part_index
+    manifest['output'] = output.state()
+    for source, _ in pending:
+        record_source(manifest, source, source_sizes[source], records_done[source])
+    save_manifest(manifest)
+    clear_checkpoint()
+    print(f"Cleaned {sum(records_done.values())} new raw records from {len(pending)} source(s)")
+    finish_profile(profiler, args)
 
     end_time = time.time()
     print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+
+# Default locations of the manifest of cleaned raw sources and of the progress of the current run
+manifest_path = "cleaning_manifest.json"
+checkpoint_path = "cleaning_checkpoint.json"
+
+# Bytes hashed at each end of the fingerprinted part of a file
+fingerprint_window = 1 << 16
+
+# Identify the first `size` bytes of a file by their length and a hash of their first and last 64 KiB,
+# so a file that only had data appended keeps the fingerprint of its earlier part
+def prefix_fingerprint(path, size):
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as file:
+        digest.update(file.read(min(size, fingerprint_window)))
+        if size > fingerprint_window:
+            file.seek(max(fingerprint_window, size - fingerprint_window))
+            digest.update(file.read(size - file.tell()))
+    return digest.hexdigest()
+
+def new_manifest(settings):
+    return {'settings': settings, 'next_part': 0, 'sources': {}}
+
+def load_manifest(path=manifest_path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+# Write to a temporary file and rename it, so a crash never leaves a half-written file
+def write_json_atomic(data, path):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump(data, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+def save_manifest(manifest, path=manifest_path):
+    write_json_atomic(manifest, path)
+
+# Byte offset from which every source still has uncleaned records; sources with nothing new are left out
+def pending_sources(manifest, sources):
+    pending = []
+    for source in sources:
+        size = os.path.getsize(source)
+        entry = manifest['sources'].get(os.path.normpath(source))
+        if entry is None:
+            pending.append((source, 0))
+            continue
+        if size < entry['bytes'] or prefix_fingerprint(source, entry['bytes']) != entry['fingerprint']:
+            raise ValueError(f"{source} changed since it was cleaned; rebuild the output without --incremental")
+        if size > entry['bytes']:
+            pending.append((source, entry['bytes']))
+    return pending
+
+# Record that a source has been cleaned up to `size` bytes and how many raw records that added
+def record_source(manifest, source, size, rows):
+    key = os.path.normpath(source)
+    entry = manifest['sources'].get(key, {'rows': 0})
+    manifest['sources'][key] = {'bytes': size, 'fingerprint': prefix_fingerprint(source, size),
+                                'rows': entry['rows'] + rows}
+
+# The checkpoint of an interrupted run, if it was made by a run with the same settings, sources and offsets
+def load_checkpoint(run, path=checkpoint_path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        checkpoint = json.load(file)
+    return checkpoint if checkpoint['run'] == run else None
+
+def save_checkpoint(checkpoint, path=checkpoint_path):
+    write_json_atomic(checkpoint, path)
+
+def clear_checkpoint(path=checkpoint_path):
+    if os.path.exists(path):
+        os.remove(path)
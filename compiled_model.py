@@ -0,0 +1,133 @@
+import argparse
+import time
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from tree_maximizer import get_base_score, parse_trees
+
+class CompiledModel:
+    """A tree ensemble flattened into contiguous node arrays and evaluated with NumPy.
+
+    All trees share one set of arrays indexed by global node number. A leaf points to itself
+    through all three children, so every row can step down one level per iteration, for the
+    depth of the deepest tree, without checking whether it has already reached a leaf.
+    """
+
+    def __init__(self, model: xgb.Booster, feature_names: Optional[List[str]] = None, block_rows: int = 65536):
+        self.feature_names = list(feature_names or model.feature_names)
+        self.base_score = get_base_score(model)
+        self.block_rows = block_rows
+
+        trees = parse_trees(model, self.feature_names)
+        sizes = [len(tree['feature']) for tree in trees]
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+        self.roots = offsets
+
+        def stacked(key, dtype):
+            return np.concatenate([np.asarray(tree[key], dtype=dtype) for tree in trees])
+
+        self.feature = stacked('feature', np.int32)
+        self.threshold = stacked('threshold', np.float32)
+        self.leaf = stacked('leaf', np.float64)
+        nodes = np.arange(len(self.feature), dtype=np.int32)
+        is_leaf = self.feature < 0
+        node_offsets = np.repeat(offsets, sizes)
+        # Row 3 * node + branch of the child table, with branch 0 for yes, 1 for no and 2 for missing
+        self.children = np.stack([
+            np.where(is_leaf, nodes, stacked(key, np.int32) + node_offsets) for key in ('yes', 'no', 'missing')
+        ], axis=1).astype(np.int32).ravel()
+        # Leaves read feature 0 and then stay where they are
+        self.feature[is_leaf] = 0
+        self.depth = max(self._tree_depth(tree) for tree in trees)
+
+    @staticmethod
+    def _tree_depth(tree):
+        depth = 0
+        level = [0]
+        while True:
+            level = [child for node in level if tree['feature'][node] >= 0
+                     for child in (tree['yes'][node], tree['no'][node])]
+            if not level:
+                return depth
+            depth += 1
+
+    @classmethod
+    def load(cls, model_filename: str, feature_names: Optional[List[str]] = None) -> 'CompiledModel':
+        model = xgb.Booster()
+        model.load_model(model_filename)
+        return cls(model, feature_names)
+
+    def _as_matrix(self, X) -> np.ndarray:
+        # XGBoost compares float32 feature values with float32 thresholds
+        if isinstance(X, pd.DataFrame):
+            X = X[self.feature_names].to_numpy(dtype=np.float32)
+        X = np.asarray(X, dtype=np.float32)
+        return X[np.newaxis, :] if X.ndim == 1 else X
+
+    def predict(self, X) -> np.ndarray:
+        """Predictions of a DataFrame (columns selected by name), a 2-D array or a single row"""
+        X = self._as_matrix(X)
+        predictions = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), self.block_rows):
+            predictions[start:start + self.block_rows] = self._predict_block(X[start:start + self.block_rows])
+        return predictions.astype(np.float32)
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        # One column per tree; every iteration moves all rows of all trees one level down
+        row_starts = (np.arange(len(X), dtype=np.int64) * X.shape[1])[:, np.newaxis]
+        values_flat = X.ravel()
+        has_missing = np.isnan(values_flat).any()
+        # The roots broadcast against the rows at the first level
+        nodes = self.roots[np.newaxis, :]
+        for _ in range(self.depth):
+            values = values_flat[row_starts + self.feature[nodes]]
+            # NaN >= threshold is False, so a missing value takes branch 0 + 2
+            branch = values >= self.threshold[nodes]
+            if has_missing:
+                branch = branch + 2 * np.isnan(values)
+            nodes = self.children[3 * nodes + branch]
+        return self.base_score + self.leaf[nodes].sum(axis=1)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the compiled model against Booster.predict and time both.")
+    parser.add_argument('--model', default='best_model_distance.xgb')
+    parser.add_argument('--rows', type=int, default=100000, help="Rows of the cleaned dataset to score")
+    parser.add_argument('--repeats', type=int, default=1000, help="Calls timed for the single-row latency")
+    return parser.parse_args()
+
+def main():
+    from cleaned_io import read_cleaned, required_columns
+
+    args = parse_args()
+    model = xgb.Booster()
+    model.load_model(args.model)
+    compiled = CompiledModel(model)
+    # Model features missing from the cleaned dataset are 0, as in shap_attributions.py
+    columns = [feature for feature in compiled.feature_names if feature in required_columns]
+    X = read_cleaned(columns=columns, nrows=args.rows).reindex(columns=compiled.feature_names, fill_value=0)
+    print(f"{len(compiled.roots)} trees, {len(compiled.feature)} nodes, depth {compiled.depth}")
+
+    # Both paths must agree up to float32 summation order
+    expected = model.predict(xgb.DMatrix(X))
+    start_time = time.time()
+    predictions = compiled.predict(X)
+    batch_time = time.time() - start_time
+    print(f"Max abs difference to Booster.predict: {np.abs(predictions - expected).max()}")
+    print(f"Batch of {len(X)} rows: {batch_time:.3f} seconds")
+
+    # Single-row latency of the DMatrix path and of the compiled model
+    row = X.iloc[[0]]
+    start_time = time.time()
+    for _ in range(args.repeats):
+        model.predict(xgb.DMatrix(row))
+    dmatrix_latency = (time.time() - start_time) / args.repeats
+    array_row = row.to_numpy(dtype=np.float32)
+    start_time = time.time()
+    for _ in range(args.repeats):
+        compiled.predict(array_row)
+    compiled_latency = (time.time() - start_time) / args.repeats
+    print(f"Single row: DMatrix {dmatrix_latency * 1e6:.0f} us, compiled {compiled_latency * 1e6:.0f} us")
+
+if __name__ == "__main__":
+    main()
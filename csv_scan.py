@@ -0,0 +1,73 @@
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Newlines and quotes of one byte range of the file. A newline ends a record only when an even
+# number of quotes precedes it, so newlines are counted separately by the quote parity before them
+# inside the range; the parity carried in from earlier ranges picks the right count afterwards.
+def block_counts(mapped, data, start, end):
+    block = data[start:end]
+    newlines = block == ord('\n')
+    # mmap.find is a plain memchr, much cheaper than building the quote mask for quote-free ranges
+    if mapped.find(b'"', start, end) < 0:
+        return int(np.count_nonzero(newlines)), 0, 0
+
+    quotes = block == ord('"')
+    quote_count = int(np.count_nonzero(quotes))
+    # A uint8 cumulative sum wraps around but keeps its parity
+    odd = (np.cumsum(quotes, dtype=np.uint8) & 1).astype(bool)
+    odd_newlines = int(np.count_nonzero(newlines & odd))
+    return int(np.count_nonzero(newlines)) - odd_newlines, odd_newlines, quote_count
+
+# Count the records of a CSV file (header included) by scanning byte ranges of the memory-mapped file in threads
+def count_csv_records(path, block_size=1 << 24, threads=None):
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        data = np.frombuffer(mapped, dtype=np.uint8)
+        ranges = [(start, min(start + block_size, size)) for start in range(0, size, block_size)]
+        with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as pool:
+            counts = list(pool.map(lambda bounds: block_counts(mapped, data, *bounds), ranges))
+        ends_with_newline = data[-1] == ord('\n')
+        del data
+
+    records = 0
+    inside_quotes = False
+    for even_newlines, odd_newlines, quote_count in counts:
+        records += odd_newlines if inside_quotes else even_newlines
+        inside_quotes ^= quote_count % 2 == 1
+
+    # The last record has no newline after it when the file does not end with one
+    return records if ends_with_newline else records + 1
+
+# Positions of the newlines of data[start:end] that end a record, given whether the range starts inside quotes
+def _record_ends(data, start, end, inside_quotes):
+    block = data[start:end]
+    newlines = block == ord('\n')
+    quotes = block == ord('"')
+    odd = (np.cumsum(quotes, dtype=np.uint8) & 1).astype(bool)
+    return np.flatnonzero(newlines & (odd == inside_quotes)), int(np.count_nonzero(quotes))
+
+# Byte offset just past the next `records` records that start at byte `start`; used to seek
+# past records that were already processed without parsing them
+def record_offset(path, start, records, block_size=1 << 24):
+    size = os.path.getsize(path)
+    if records == 0 or start >= size:
+        return start
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        data = np.frombuffer(mapped, dtype=np.uint8)
+        offset = size
+        inside_quotes = False
+        for block_start in range(start, size, block_size):
+            ends, quote_count = _record_ends(data, block_start, min(block_start + block_size, size), inside_quotes)
+            if len(ends) >= records:
+                offset = block_start + int(ends[records - 1]) + 1
+                break
+            records -= len(ends)
+            inside_quotes ^= quote_count % 2 == 1
+        del data
+    return offset
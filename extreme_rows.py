@@ -0,0 +1,122 @@
+import argparse
+import heapq
+import itertools
+import os
+import time
+import pandas as pd
+from raw_io import read_raw, raw_csv_path, cleaning_columns
+
+# Derived metrics that can be ranked, computed from the raw columns of a chunk
+def affected_time(chunk):
+    # The first 19 characters are 'YYYY-MM-DD HH:MM:SS'; fractional seconds are dropped
+    start = pd.to_datetime(chunk['Start_Time'].str[:19], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+    end = pd.to_datetime(chunk['End_Time'].str[:19], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+    return (end - start).dt.total_seconds()
+
+def affected_distance(chunk):
+    return chunk['Distance(mi)']
+
+metric_functions = {
+    'Affected_Time': affected_time,
+    'Affected_Distance': affected_distance
+}
+
+# Values at or above these limits are treated as data errors and never ranked
+metric_upper_limits = {
+    'Affected_Time': 1000000
+}
+
+# Load IDs to skip from a file with one ID per line
+def load_excluded_ids(path):
+    if path is None or not os.path.exists(path):
+        return set()
+    with open(path) as file:
+        return {line.strip() for line in file if line.strip() and not line.startswith('#')}
+
+class StreamingExtremes:
+    """Top-k and bottom-k rows of several metrics, overall and per group, kept in bounded heaps."""
+
+    def __init__(self, metrics, k=5, group_by=None, bottom=True):
+        self.metrics = metrics
+        self.k = k
+        self.group_by = group_by
+        self.directions = ['top', 'bottom'] if bottom else ['top']
+        # (metric, direction, group) -> min-heap of (key, sequence, row); key is the value for top and -value for bottom
+        self.heaps = {}
+        self.sequence = itertools.count()
+
+    def update(self, chunk):
+        for metric in self.metrics:
+            values = chunk[metric]
+            if metric in metric_upper_limits:
+                values = values[values < metric_upper_limits[metric]]
+            values = values.dropna()
+            for direction in self.directions:
+                self._push(metric, direction, '(all)', chunk, values)
+                if self.group_by is not None:
+                    groups = chunk.loc[values.index, self.group_by].astype(str)
+                    for group, group_values in values.groupby(groups, sort=False):
+                        self._push(metric, direction, group, chunk, group_values)
+
+    def _push(self, metric, direction, group, chunk, values):
+        # Only the chunk's own k best rows can enter the heap
+        candidates = values.nlargest(self.k) if direction == 'top' else values.nsmallest(self.k)
+        heap = self.heaps.setdefault((metric, direction, group), [])
+        for index, value in candidates.items():
+            key = value if direction == 'top' else -value
+            if len(heap) < self.k:
+                heapq.heappush(heap, (key, next(self.sequence), chunk.loc[index]))
+            elif key > heap[0][0]:
+                heapq.heapreplace(heap, (key, next(self.sequence), chunk.loc[index]))
+
+    def results(self):
+        """One row per kept record with its metric, direction, group and rank"""
+        records = []
+        for (metric, direction, group), heap in sorted(self.heaps.items()):
+            for rank, (_, _, row) in enumerate(sorted(heap, key=lambda item: (-item[0], item[1])), 1):
+                records.append({'Metric': metric, 'Direction': direction, 'Group': group, 'Rank': rank, **row.to_dict()})
+        return pd.DataFrame(records)
+
+    def best_row(self, metric, direction='top', group='(all)'):
+        """The single most extreme row, or None when nothing was ranked"""
+        heap = self.heaps.get((metric, direction, group))
+        if not heap:
+            return None
+        return max(heap, key=lambda item: (item[0], -item[1]))[2]
+
+# Drop excluded IDs and add the derived metric columns to a raw chunk
+def prepare_chunk(chunk, metrics, excluded_ids):
+    if excluded_ids:
+        chunk = chunk[~chunk['ID'].isin(excluded_ids)]
+    chunk = chunk.copy()
+    for metric in metrics:
+        chunk[metric] = metric_functions[metric](chunk)
+    return chunk
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the most extreme incidents of the raw file in one scan.")
+    parser.add_argument('--metrics', nargs='+', choices=list(metric_functions), default=list(metric_functions))
+    parser.add_argument('--k', type=int, default=10, help="Rows kept per metric, direction and group")
+    parser.add_argument('--group-by', default=None, help="Also rank within every value of this column, e.g. State")
+    parser.add_argument('--top-only', action='store_true', help="Skip the bottom-k rankings")
+    parser.add_argument('--exclude-ids', default='excluded_ids.txt', help="File with one ID to skip per line")
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--output', default='extreme_rows.csv')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+
+    excluded_ids = load_excluded_ids(args.exclude_ids)
+    extremes = StreamingExtremes(args.metrics, k=args.k, group_by=args.group_by, bottom=not args.top_only)
+    for chunk in read_raw(raw_csv_path, columns=['ID'] + cleaning_columns, chunksize=args.chunk_size):
+        extremes.update(prepare_chunk(chunk, args.metrics, excluded_ids))
+
+    extremes.results().to_csv(args.output, index=False)
+
+    end_time = time.time()
+    print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
+
+if __name__ == "__main__":
+    main()
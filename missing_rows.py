@@ -1,50 +1,63 @@
+import numpy as np
 import pandas as pd
 import time
 
-start_time = time.time()
-
-# Load the CSV file
-df = pd.read_csv('us_accidents_cleaned.csv')
-
-# Count the number of missing values per row
-missing_data_per_row = df.isnull().sum(axis=1)
-
-# Count how many rows have 1, 2, 3, ... missing values
-missing_counts = missing_data_per_row.value_counts().sort_index()
-
-# Calculate the percentage of rows with missing 1, 2, 3, ... columns
-total_rows = len(df)
-
-# Iterate through the counts of missing values per row
-for missing, count in missing_counts.items():
-    percentage = (count / total_rows) * 100
-    column_label = 'column' if missing == 1 else 'columns'
-    
-    # Print the percentage of rows with missing columns
-    print(f"Missing {missing} {column_label}: {percentage:.5f}% of rows.")
-    
-    # Identify the most common missing columns for this number of missing values
-    if missing > 0:
-        # Get the rows where exactly 'missing' columns are NaN
-        rows_with_missing = missing_data_per_row[missing_data_per_row == missing]
-        
-        # Get the columns that are missing in these rows
-        missing_columns = df.columns[df.iloc[rows_with_missing.index].isnull().any()]
-        
-        # Calculate the percentage of missing columns
-        column_missing_percent = {}
-        for col in missing_columns:
-            # Count how many rows in 'rows_with_missing' have a missing value for this column
-            missing_in_col = rows_with_missing[df.loc[rows_with_missing.index, col].isnull()].count()
-            column_missing_percent[col] = (missing_in_col / count) * 100
-        
-        # Sort the columns by most common missing
-        sorted_missing_columns = sorted(column_missing_percent.items(), key=lambda x: x[1], reverse=True)
-        
-        # Print the top missing columns
-        top_columns = sorted_missing_columns[:(missing + 2)]  # Get x+2 columns
-        top_columns_str = ', '.join([f"'{col}' - {pct:.1f}%" for col, pct in top_columns])
-        print(f"  Most common: {top_columns_str}")
-
-end_time = time.time()
-print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
+# Count the null pattern of every row in one chunked pass; each pattern is the row's packed null bitmask
+def profile_missing_patterns(chunks):
+    columns = None
+    pattern_counts = {}
+    total_rows = 0
+    for chunk in chunks:
+        if columns is None:
+            columns = list(chunk.columns)
+        masks = np.ascontiguousarray(np.packbits(chunk.isnull().to_numpy(), axis=1))
+        patterns, counts = np.unique(masks.view(f'V{masks.shape[1]}').ravel(), return_counts=True)
+        for pattern, count in zip(patterns, counts):
+            key = pattern.tobytes()
+            pattern_counts[key] = pattern_counts.get(key, 0) + int(count)
+        total_rows += len(chunk)
+    return columns, pattern_counts, total_rows
+
+# Per missing-count bucket: number of rows and how many of them miss each column
+def missing_buckets(columns, pattern_counts):
+    buckets = {}
+    for key, count in pattern_counts.items():
+        missing_mask = np.unpackbits(np.frombuffer(key, dtype=np.uint8))[:len(columns)].astype(bool)
+        missing = int(missing_mask.sum())
+        rows, column_counts = buckets.get(missing, (0, np.zeros(len(columns), dtype=np.int64)))
+        buckets[missing] = (rows + count, column_counts + count * missing_mask)
+    return dict(sorted(buckets.items()))
+
+def main():
+    start_time = time.time()
+
+    # Stream the CSV file
+    columns, pattern_counts, total_rows = profile_missing_patterns(
+        pd.read_csv('us_accidents_cleaned.csv', chunksize=100000))
+
+    # Iterate through the counts of missing values per row
+    for missing, (count, column_counts) in missing_buckets(columns, pattern_counts).items():
+        percentage = (count / total_rows) * 100
+        column_label = 'column' if missing == 1 else 'columns'
+
+        # Print the percentage of rows with missing columns
+        print(f"Missing {missing} {column_label}: {percentage:.5f}% of rows.")
+
+        # Identify the most common missing columns for this number of missing values
+        if missing > 0:
+            column_missing_percent = {col: column_counts[i] / count * 100
+                                      for i, col in enumerate(columns) if column_counts[i] > 0}
+
+            # Sort the columns by most common missing
+            sorted_missing_columns = sorted(column_missing_percent.items(), key=lambda x: x[1], reverse=True)
+
+            # Print the top missing columns
+            top_columns = sorted_missing_columns[:(missing + 2)]  # Get x+2 columns
+            top_columns_str = ', '.join([f"'{col}' - {pct:.1f}%" for col, pct in top_columns])
+            print(f"  Most common: {top_columns_str}")
+
+    end_time = time.time()
+    print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
+
+if __name__ == "__main__":
+    main()
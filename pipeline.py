@@ -0,0 +1,340 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from cleaned_io import default_cleaned_path, training_data_path
+from cleaning_manifest import write_json_atomic
+from raw_io import raw_csv_path, raw_sample_path
+
+# Default locations of the stage cache and of the captured output of every stage
+cache_path = "pipeline_cache.json"
+log_dir = "pipeline_logs"
+
+# Directory of the scripts, so local imports can be told apart from installed packages
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+class Stage:
+    """One script of the pipeline with the files it reads and writes and its command line options.
+
+    A stage depends on every stage that writes one of its inputs, plus the stages named in `after`
+    for an ordering that goes through a file edited by hand. Its stdout and stderr are captured
+    in pipeline_logs/<name>.log, which also counts as one of its outputs. A path or option value
+    may be a function, such as default_cleaned_path, called whenever the stage is checked or run.
+    An optional stage only runs when it is named as a target or needed by one.
+    """
+
+    def __init__(self, name, script, inputs=(), outputs=(), params=None, after=(), optional=False):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = dict(params or {})
+        self.after = list(after)
+        self.optional = optional
+
+    @property
+    def log_path(self):
+        return os.path.join(log_dir, f"{self.name}.log")
+
+    def command(self):
+        command = [sys.executable, self.script]
+        for option, value in self.params.items():
+            value = resolve(value)
+            if value is True:
+                command.append(f"--{option}")
+            elif value is not False and value is not None:
+                command.extend([f"--{option}", str(value)])
+        return command
+
+# The workflow: sample -> clean -> train -> search, the analytics of the cleaned sample beside training,
+# and the scripts around the row with the longest affected time. The cleaned output is wherever the last
+# cleaning run wrote it, and training reads the feature store instead when that run wrote one.
+stages = [
+    Stage('sample', 'random_sample.py', inputs=[raw_csv_path], outputs=[raw_sample_path],
+          params={'n': 250000, 'seed': 1}),
+    Stage('clean', 'cleaning.py', inputs=[raw_sample_path], outputs=[default_cleaned_path]),
+    # train_model.py names its Optuna study after a fingerprint of the cleaned data, so new data gets a new study
+    Stage('train', 'train_model.py', inputs=[training_data_path],
+          outputs=['best_model_distance.xgb', 'feature_importances_distance.csv'], params={'n-trials': 50},
+          after=['clean']),
+    Stage('search', 'search_model.py', inputs=['best_model_distance.xgb'], params={'mode': 'random'}),
+    Stage('shap', 'shap_attributions.py', inputs=['best_model_distance.xgb', default_cleaned_path],
+          outputs=['shap_contributions.parquet', 'shap_summary.parquet']),
+    Stage('cube', 'aggregate_cube.py', inputs=[default_cleaned_path], outputs=['aggregate_cube.parquet'],
+          params={'input': default_cleaned_path}),
+    Stage('state_comparison', 'state_comparison.py', inputs=['aggregate_cube.parquet']),
+    Stage('profile', 'sample_preview.py', inputs=[default_cleaned_path], params={'path': default_cleaned_path}),
+    Stage('extreme_rows', 'extreme_rows.py', inputs=[raw_csv_path, 'excluded_ids.txt'],
+          outputs=['extreme_rows.csv']),
+    Stage('feature_importance', 'feature_importance.py', inputs=[raw_csv_path],
+          outputs=['max_affected_time_row.csv']),
+    # The row found by feature_importance.py is cleaned by hand into max_affected_time_row_cleaned.csv,
+    # whose columns cleaner.py then puts in the model's order in place. Neither that file nor the
+    # best_model_time2.xgb booster is written by a stage, so these two only run when asked for.
+    Stage('cleaner', 'cleaner.py', inputs=['max_affected_time_row_cleaned.csv'],
+          outputs=['max_affected_time_row_cleaned.csv'], after=['feature_importance'], optional=True),
+    Stage('max_time', 'max_time.py', inputs=['best_model_time2.xgb', 'max_affected_time_row_cleaned.csv'],
+          optional=True),
+]
+
+# A declared path or option value, calling it when it is a function
+def resolve(value):
+    return value() if callable(value) else value
+
+# What two declared paths are compared by: the function itself, or the normalized path
+def path_identity(path):
+    return path if callable(path) else os.path.normpath(path)
+
+# Stages each stage waits for: the writers of its inputs and the stages it is declared to run after
+def stage_dependencies(stages):
+    writers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            writers.setdefault(path_identity(output), stage.name)
+    dependencies = {}
+    for stage in stages:
+        names = {writers[path_identity(path)] for path in stage.inputs if path_identity(path) in writers}
+        names.discard(stage.name)
+        dependencies[stage.name] = names | set(stage.after)
+    return dependencies
+
+# Local modules a script imports, followed recursively, so editing a shared module invalidates its users
+def code_files(script):
+    found = []
+    pending = [os.path.join(repo_dir, script)]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.append(path)
+        with open(path) as file:
+            tree = ast.parse(file.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                module_path = os.path.join(repo_dir, module.split('.')[0] + ".py")
+                if os.path.exists(module_path):
+                    pending.append(module_path)
+    return sorted(found)
+
+class FileHasher:
+    """sha256 of files and directories, remembered by size and modification time between runs.
+
+    The raw dataset is several GB, so it is only read again once it has actually been rewritten.
+    """
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self.known.get(key)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        self.known[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    # A directory, such as a Parquet dataset, hashes its relative file names and their contents
+    def hash(self, path):
+        if not os.path.exists(path):
+            return None
+        if not os.path.isdir(path):
+            return self.file_hash(path)
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(self.file_hash(file_path).encode())
+        return digest.hexdigest()
+
+# Cache key of a stage: its command line, the code it runs and the contents of the files it reads
+def stage_key(stage, hasher):
+    inputs = {}
+    for path in map(resolve, stage.inputs):
+        inputs[path] = hasher.hash(path)
+        if inputs[path] is None:
+            raise FileNotFoundError(f"Stage {stage.name} needs {path}, which does not exist")
+    description = {
+        'command': stage.command()[1:],
+        'code': {os.path.relpath(path, repo_dir): hasher.hash(path) for path in code_files(stage.script)},
+        'inputs': inputs
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+def output_hashes(stage, hasher):
+    return {path: hasher.hash(path) for path in map(resolve, stage.outputs + [stage.log_path])}
+
+def load_cache(path=cache_path):
+    if not os.path.exists(path):
+        return {'files': {}, 'stages': {}}
+    with open(path) as file:
+        return json.load(file)
+
+# A stage is up to date when its key matches the one it last ran with and its outputs are unchanged since.
+# A stage that rewrites one of its inputs also matches the key computed from its own result.
+def is_fresh(stage, key, cache, hasher):
+    entry = cache['stages'].get(stage.name)
+    if entry is None or key not in entry['keys']:
+        return False
+    return output_hashes(stage, hasher) == entry['outputs']
+
+# Run a stage's script from the repository directory with its output captured in its log
+def run_stage(stage):
+    os.makedirs(log_dir, exist_ok=True)
+    # Plots go to the non-interactive backend instead of blocking the run on a window
+    env = dict(os.environ, MPLBACKEND='Agg')
+    start_time = time.time()
+    with open(stage.log_path, 'w') as log:
+        result = subprocess.run(stage.command(), stdout=log, stderr=subprocess.STDOUT, env=env, cwd=repo_dir)
+    return result.returncode, time.time() - start_time
+
+# Stages needed to build the targets, in declaration order; without targets, every stage that is not optional
+def select_stages(stages, targets, dependencies):
+    if not targets:
+        return [stage for stage in stages if not stage.optional]
+    needed = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in dependencies:
+            raise ValueError(f"Unknown stage: {name}")
+        if name not in needed:
+            needed.add(name)
+            pending.extend(dependencies[name])
+    return [stage for stage in stages if stage.name in needed]
+
+# Start every stage whose dependencies have finished, up to `jobs` at a time, and skip the up-to-date ones.
+# A failed stage stops only the stages that depend on it.
+def run_pipeline(stages, jobs=2, force=(), dry_run=False, path=cache_path):
+    names = {stage.name for stage in stages}
+    dependencies = {name: needs & names for name, needs in stage_dependencies(stages).items()}
+    cache = load_cache(path)
+    hasher = FileHasher(cache['files'])
+    waiting = {stage.name: stage for stage in stages}
+    done = set()
+    # Stages whose result changed; a dry run assumes every stage it would run changes its outputs
+    changed = set()
+    failed = set()
+    running = {}
+    summary = []
+
+    def save_cache():
+        cache['files'] = hasher.known
+        write_json_atomic(cache, path)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while waiting or running:
+            for name, stage in list(waiting.items()):
+                if dependencies[name] & failed:
+                    del waiting[name]
+                    failed.add(name)
+                    summary.append((name, 'blocked', 0.0))
+                    continue
+                if not dependencies[name] <= done:
+                    continue
+                del waiting[name]
+                if dry_run and dependencies[name] & changed:
+                    changed.add(name)
+                    summary.append((name, 'would run', 0.0))
+                    done.add(name)
+                    continue
+                try:
+                    key = stage_key(stage, hasher)
+                except FileNotFoundError as error:
+                    failed.add(name)
+                    summary.append((name, str(error), 0.0))
+                    continue
+                if name not in force and is_fresh(stage, key, cache, hasher):
+                    summary.append((name, 'cached', 0.0))
+                    done.add(name)
+                    continue
+                if dry_run:
+                    changed.add(name)
+                    summary.append((name, 'would run', 0.0))
+                    done.add(name)
+                    continue
+                print(f"Running {name}: {' '.join(stage.command()[1:])}")
+                running[pool.submit(run_stage, stage)] = (stage, key)
+
+            if not running:
+                if waiting:
+                    raise ValueError(f"Stages depend on each other in a cycle: {', '.join(waiting)}")
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key = running.pop(future)
+                returncode, elapsed = future.result()
+                if returncode != 0:
+                    failed.add(stage.name)
+                    summary.append((stage.name, f"failed ({returncode}), see {stage.log_path}", elapsed))
+                    continue
+                outputs = output_hashes(stage, hasher)
+                missing = [output for output, digest in outputs.items() if digest is None]
+                if missing:
+                    failed.add(stage.name)
+                    summary.append((stage.name, f"did not write {', '.join(missing)}", elapsed))
+                    continue
+                cache['stages'][stage.name] = {'keys': sorted({key, stage_key(stage, hasher)}), 'outputs': outputs}
+                save_cache()
+                done.add(stage.name)
+                summary.append((stage.name, 'ran', elapsed))
+
+    if not dry_run:
+        save_cache()
+    return summary, failed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the pipeline stages whose code, inputs or options changed.")
+    parser.add_argument('targets', nargs='*', help="Stages to bring up to date, with the stages they need "
+                                                   f"(default: all of {', '.join(stage.name for stage in stages if not stage.optional)})")
+    parser.add_argument('--jobs', type=int, default=2, help="Stages run at the same time")
+    parser.add_argument('--set', action='append', default=[], metavar='STAGE.OPTION=VALUE',
+                        help="Override a command line option of a stage, e.g. search.mode=exact")
+    parser.add_argument('--force', nargs='+', default=[], metavar='STAGE', help="Rerun these stages even if cached")
+    parser.add_argument('--dry-run', action='store_true', help="Only list the stages that would run")
+    return parser.parse_args()
+
+# Apply STAGE.OPTION=VALUE overrides to the declared stage options
+def apply_overrides(stages, overrides):
+    by_name = {stage.name: stage for stage in stages}
+    for override in overrides:
+        target, _, value = override.partition('=')
+        name, _, option = target.partition('.')
+        if name not in by_name or not option or not value:
+            raise ValueError(f"Expected STAGE.OPTION=VALUE with a known stage, got {override}")
+        by_name[name].params[option] = {'true': True, 'false': False}.get(value.lower(), value)
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+    # The declared paths, the cache and the logs are relative to the repository, where the stages run
+    os.chdir(repo_dir)
+    apply_overrides(stages, args.set)
+    selected = select_stages(stages, args.targets, stage_dependencies(stages))
+    summary, failed = run_pipeline(selected, jobs=args.jobs, force=set(args.force), dry_run=args.dry_run)
+
+    for name, status, elapsed in summary:
+        print(f"{name:<20} {status:<12} {elapsed:8.1f} s")
+    print(f"Total processing time: {time.time() - start_time:.2f} seconds")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
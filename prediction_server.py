@@ -0,0 +1,241 @@
+import argparse
+import collections
+import json
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import xgboost as xgb
+from cleaned_io import required_columns, model_feature_names
+
+class LatencyStats:
+    """Request and batch counters plus a window of recent request latencies."""
+
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+
+    def record_request(self, rows, latency):
+        with self.lock:
+            self.requests += 1
+            self.rows += rows
+            self.latencies.append(latency)
+
+    def record_batch(self):
+        with self.lock:
+            self.batches += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = np.array(self.latencies, dtype=np.float64)
+            elapsed = time.time() - self.started
+            stats = {
+                'requests': self.requests,
+                'rows': self.rows,
+                'batches': self.batches,
+                'rows_per_batch': self.rows / self.batches if self.batches else 0.0,
+                'requests_per_second': self.requests / elapsed,
+                'rows_per_second': self.rows / elapsed
+            }
+        for percentile in (50, 90, 99):
+            stats[f"latency_p{percentile}_ms"] = float(np.percentile(latencies, percentile) * 1000) if len(latencies) else None
+        return stats
+
+class MicroBatcher:
+    """Gathers the rows of concurrent requests into one predict call.
+
+    A batch is sent as soon as it holds max_batch_rows rows or its oldest request has waited
+    max_latency seconds, whichever comes first.
+    """
+
+    def __init__(self, model, feature_names, max_latency=0.005, max_batch_rows=4096, stats=None):
+        self.model = model
+        self.feature_names = feature_names
+        self.max_latency = max_latency
+        self.max_batch_rows = max_batch_rows
+        self.stats = stats or LatencyStats()
+        self.pending = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, X):
+        """Queue a float32 feature matrix; the future resolves to its predictions"""
+        future = Future()
+        self.pending.put((X, future))
+        return future
+
+    def predict(self, X):
+        return self.submit(X).result()
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            rows = len(batch[0][0])
+            deadline = time.monotonic() + self.max_latency
+            while rows < self.max_batch_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self._predict(batch)
+
+    def _predict(self, batch):
+        try:
+            predictions = self.model.inplace_predict(np.concatenate([X for X, _ in batch]))
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        self.stats.record_batch()
+        start = 0
+        for X, future in batch:
+            future.set_result(predictions[start:start + len(X)])
+            start += len(X)
+
+# Feature matrix of rows given as dicts in the required_columns schema. Columns that are not model features,
+# such as the targets and Source, are dropped, and features missing from a row are 0; any key that is neither
+# a cleaned column nor a model feature is an error
+def rows_to_matrix(rows, feature_names):
+    known = set(required_columns) | set(feature_names)
+    for number, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise TypeError(f"Row {number} is not an object")
+        unknown = row.keys() - known
+        if unknown:
+            raise ValueError(f"Row {number} has unknown columns {sorted(unknown)}")
+    return np.array([[row.get(feature, 0) for feature in feature_names] for row in rows],
+                    dtype=np.float32).reshape(len(rows), len(feature_names))
+
+def make_handler(batcher):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        """POST /predict with {"rows": [{column: value, ...}, ...]}; GET /stats for throughput and latency."""
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send(404, {'error': f"Unknown path: {self.path}"})
+                return
+            start_time = time.perf_counter()
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                X = rows_to_matrix(body['rows'], batcher.feature_names)
+            except (ValueError, KeyError, TypeError) as error:
+                self._send(400, {'error': str(error)})
+                return
+            if len(X) == 0:
+                self._send(200, {'predictions': []})
+                return
+            try:
+                predictions = batcher.predict(X)
+            except Exception as error:
+                self._send(500, {'error': str(error)})
+                return
+            batcher.stats.record_request(len(X), time.perf_counter() - start_time)
+            self._send(200, {'predictions': predictions.tolist()})
+
+        def do_GET(self):
+            if self.path != '/stats':
+                self._send(404, {'error': f"Unknown path: {self.path}"})
+                return
+            self._send(200, batcher.stats.snapshot())
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictionHandler
+
+# Load the booster once and serve it until interrupted (port 0 picks a free port)
+def make_server(model_filename, host='127.0.0.1', port=8765, max_latency=0.005, max_batch_rows=4096):
+    model = xgb.Booster()
+    model.load_model(model_filename)
+    batcher = MicroBatcher(model, model_feature_names(model), max_latency=max_latency, max_batch_rows=max_batch_rows)
+    return ThreadingHTTPServer((host, port), make_handler(batcher))
+
+# Client side: post rows to a running server and return their predictions
+def request_predictions(url, rows):
+    request = urllib.request.Request(f"{url}/predict", data=json.dumps({'rows': rows}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())['predictions']
+
+def request_stats(url):
+    with urllib.request.urlopen(f"{url}/stats") as response:
+        return json.loads(response.read())
+
+# Offline check: serve on a free local port and send concurrent requests of cleaned rows from client threads
+def run_benchmark(args):
+    from cleaned_io import read_cleaned
+
+    server = make_server(args.model, args.host, 0, args.max_latency_ms / 1000, args.max_batch_rows)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{args.host}:{server.server_address[1]}"
+
+    rows = read_cleaned(nrows=args.rows_per_request * args.requests)
+    records = json.loads(rows.to_json(orient='records'))
+    requests = [records[i:i + args.rows_per_request] for i in range(0, len(records), args.rows_per_request)]
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        served = list(pool.map(lambda request_rows: request_predictions(url, request_rows), requests))
+    elapsed = time.time() - start_time
+
+    # The served predictions must equal one direct predict call over all rows
+    model = xgb.Booster()
+    model.load_model(args.model)
+    expected = model.inplace_predict(rows_to_matrix(records, model_feature_names(model)))
+    print(f"Max abs difference to direct predict: {np.abs(np.concatenate(served) - expected).max()}")
+    print(f"{len(requests)} requests from {args.clients} clients in {elapsed:.2f} seconds")
+    print(json.dumps(request_stats(url), indent=2))
+    server.shutdown()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the trained booster over local HTTP with micro-batching.")
+    parser.add_argument('--model', default='best_model_distance.xgb')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-latency-ms', type=float, default=5.0,
+                        help="Longest time a request waits for others to join its batch")
+    parser.add_argument('--max-batch-rows', type=int, default=4096)
+    parser.add_argument('--benchmark', action='store_true',
+                        help="Start a server on a free port, send it concurrent requests and print the stats")
+    parser.add_argument('--clients', type=int, default=16, help="Concurrent client threads in the benchmark")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests sent in the benchmark")
+    parser.add_argument('--rows-per-request', type=int, default=1)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.benchmark:
+        run_benchmark(args)
+        return
+
+    server = make_server(args.model, args.host, args.port, args.max_latency_ms / 1000, args.max_batch_rows)
+    print(f"Serving {args.model} on http://{args.host}:{server.server_address[1]} (POST /predict, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
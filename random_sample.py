@@ -1,19 +1,81 @@
-import pandas as pd
+import argparse
 import time
+import numpy as np
+import pandas as pd
+from raw_io import read_raw, raw_csv_path, raw_sample_path, cleaning_columns
+
+# Stratum label of every row of a chunk ('State' or the year of 'Start_Time')
+def stratum_labels(chunk, stratify):
+    if stratify == 'year':
+        return chunk['Start_Time'].str[:4]
+    return chunk[stratify].astype(str)
+
+# Single-pass reservoir sample of n rows over a stream of chunks
+def reservoir_sample(chunks, n, seed=1, stratify=None, min_per_stratum=0):
+    # Every row draws a uniform key and the sample is the n rows with the smallest keys. With stratify,
+    # the min_per_stratum smallest keys of every stratum are kept as well, so rare strata survive.
+    # The reservoir never holds more than n + min_per_stratum rows per stratum.
+    rng = np.random.default_rng(seed)
+    reservoir = None
+
+    for chunk in chunks:
+        chunk = chunk.assign(_key=rng.random(len(chunk)))
+        if stratify is not None:
+            chunk['_stratum'] = stratum_labels(chunk, stratify)
+        candidates = chunk if reservoir is None else pd.concat([reservoir, chunk])
+        reservoir = _select(candidates, n, stratify, min_per_stratum, keep_spare=True)
+
+    if reservoir is None:
+        return pd.DataFrame()
+    sample = _select(reservoir, n, stratify, min_per_stratum, keep_spare=False)
+    return sample.drop(columns=['_key', '_stratum'], errors='ignore').reset_index(drop=True)
+
+# Keep the rows that can still end up in the sample; without keep_spare trim to exactly n rows
+def _select(candidates, n, stratify, min_per_stratum, keep_spare):
+    candidates = candidates.sort_values('_key', kind='stable')
+    if stratify is None or min_per_stratum <= 0:
+        return candidates.iloc[:n]
+
+    guaranteed = candidates.groupby('_stratum', sort=False, observed=True).cumcount().to_numpy() < min_per_stratum
+    if keep_spare:
+        in_top_n = np.arange(len(candidates)) < n
+        return candidates[guaranteed | in_top_n]
+
+    # Guaranteed rows first, then fill the remaining slots with the smallest keys
+    n_fill = max(n - int(guaranteed.sum()), 0)
+    fill = np.flatnonzero(~guaranteed)[:n_fill]
+    selected = np.sort(np.concatenate([np.flatnonzero(guaranteed), fill]))
+    return candidates.iloc[selected]
+
+# Command line options for a sampling run
+def parse_args():
+    parser = argparse.ArgumentParser(description="Draw a random sample of the raw US Accidents CSV in one pass.")
+    parser.add_argument('--n', type=int, default=250000, help="Number of rows in the sample")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed of the sample")
+    parser.add_argument('--stratify', choices=['State', 'year'], default=None,
+                        help="Keep a minimum number of rows for every state or year")
+    parser.add_argument('--min-per-stratum', type=int, default=1000,
+                        help="Rows kept for every stratum when --stratify is set (fewer if the stratum is smaller); "
+                             "the sample grows beyond --n if the strata need more rows than that")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Rows read from the raw file at a time")
+    return parser.parse_args()
 
-start_time = time.time()
+def main():
+    args = parse_args()
+    start_time = time.time()
 
-# Load the CSV file
-csv_file = 'us_accidents.csv'
-df = pd.read_csv(csv_file)
+    # Stream the columns needed downstream with declared dtypes
+    chunks = read_raw(raw_csv_path, columns=['ID'] + cleaning_columns, chunksize=args.chunk_size)
+    sample_data = reservoir_sample(chunks, args.n, seed=args.seed, stratify=args.stratify,
+                                   min_per_stratum=args.min_per_stratum)
 
-# Randomly select n rows
-sample_data = df.sample(n=250000, random_state=1)
+    # Save the sample to a new CSV file
+    sample_data.to_csv(raw_sample_path, index=False)
 
-# Save the sample to a new CSV file
-sample_data.to_csv('us_accidents_sample.csv', index=False)
+    end_time = time.time()
+    print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
 
-end_time = time.time()
-print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
+    print("Random Sampling Complete.")
 
-print("Random Sampling Complete.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import io
+import pandas as pd
+
+# Default locations of the raw dataset and of the random sample taken from it
+raw_csv_path = "us_accidents.csv"
+raw_sample_path = "us_accidents_sample.csv"
+
+# Boolean road feature columns of the raw file
+boolean_columns = [
+    'Amenity', 'Bump', 'Crossing', 'Give_Way', 'Junction', 'No_Exit', 'Railway',
+    'Roundabout', 'Station', 'Stop', 'Traffic_Calming', 'Traffic_Signal', 'Turning_Loop'
+]
+
+# Declared dtypes of the raw file, so pandas does not have to infer them
+raw_dtypes = {
+    'ID': str,
+    'Source': str,
+    'Severity': 'Int64',
+    'Start_Time': str,
+    'End_Time': str,
+    'Start_Lat': 'float64',
+    'Start_Lng': 'float64',
+    'End_Lat': 'float64',
+    'End_Lng': 'float64',
+    'Distance(mi)': 'float64',
+    'Description': str,
+    'Street': str,
+    'City': str,
+    'County': str,
+    'State': 'category',
+    'Zipcode': str,
+    'Country': str,
+    'Timezone': str,
+    'Airport_Code': str,
+    'Weather_Timestamp': str,
+    'Temperature(F)': 'float64',
+    'Wind_Chill(F)': 'float64',
+    'Humidity(%)': 'float64',
+    'Pressure(in)': 'float64',
+    'Visibility(mi)': 'float64',
+    'Wind_Direction': 'category',
+    'Wind_Speed(mph)': 'float64',
+    'Precipitation(in)': 'float64',
+    'Weather_Condition': 'category',
+    **{col: bool for col in boolean_columns},
+    'Sunrise_Sunset': str,
+    'Civil_Twilight': str,
+    'Nautical_Twilight': str,
+    'Astronomical_Twilight': str
+}
+
+# Raw columns that cleaning.process_chunk actually reads; everything else is dropped in its Step 1
+cleaning_columns = [
+    'Source', 'Start_Time', 'End_Time', 'Start_Lat', 'Start_Lng', 'Distance(mi)', 'Street', 'State',
+    'Temperature(F)', 'Humidity(%)', 'Pressure(in)', 'Visibility(mi)', 'Wind_Direction',
+    'Wind_Speed(mph)', 'Precipitation(in)', 'Weather_Condition',
+    *[col for col in boolean_columns if col != 'Turning_Loop'],
+    'Sunrise_Sunset', 'Civil_Twilight', 'Nautical_Twilight', 'Astronomical_Twilight'
+]
+
+# Read the raw CSV with declared dtypes, optionally pruned to columns and/or split into chunks.
+# A byte offset (at a record boundary past the header) reads only the records from there on, and an
+# end (at a record boundary) stops reading there, even if the file has grown since.
+def read_raw(path=raw_csv_path, columns=None, chunksize=None, engine='c', offset=0, end=None):
+    if offset > 0 or end is not None:
+        if chunksize is None:
+            raise ValueError("Reading a byte range needs a chunksize")
+        return _read_raw_range(path, columns, chunksize, engine, offset, end)
+    if engine == 'pyarrow':
+        if chunksize is not None:
+            return _read_raw_pyarrow_chunks(path, columns, chunksize)
+        return pd.read_csv(path, usecols=columns, dtype=_dtypes_for(columns), engine='pyarrow')
+    return pd.read_csv(path, usecols=columns, dtype=_dtypes_for(columns), chunksize=chunksize)
+
+# Column names of a raw file, from its header line
+def raw_header(path):
+    return list(pd.read_csv(path, nrows=0).columns)
+
+class _BoundedReader(io.RawIOBase):
+    """A binary file read from its current position that ends at byte `end`."""
+
+    def __init__(self, file, end):
+        self.file = file
+        self.remaining = end - file.tell()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        read = self.file.readinto(memoryview(buffer)[:size])
+        self.remaining -= read
+        return read
+
+# From offset 0 the header is read from the file itself; past it, the column names come from the header line
+def _read_raw_range(path, columns, chunksize, engine, offset, end):
+    names = raw_header(path) if offset > 0 else None
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        if end is not None:
+            file = io.BufferedReader(_BoundedReader(file, end))
+        if engine == 'pyarrow':
+            yield from _read_raw_pyarrow_chunks(file, columns, chunksize, column_names=names)
+        else:
+            yield from pd.read_csv(file, header=None if names else 'infer', names=names, usecols=columns,
+                                   dtype=_dtypes_for(columns), chunksize=chunksize)
+
+def _dtypes_for(columns):
+    if columns is None:
+        return raw_dtypes
+    return {col: raw_dtypes[col] for col in columns if col in raw_dtypes}
+
+# Stream the file with pyarrow's multithreaded CSV reader and regroup its record batches into chunks
+def _read_raw_pyarrow_chunks(path, columns, chunksize, column_names=None):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    column_types = {}
+    for col, dtype in _dtypes_for(columns).items():
+        if dtype == 'category':
+            column_types[col] = pa.dictionary(pa.int32(), pa.string())
+        elif dtype is str:
+            column_types[col] = pa.string()
+        elif dtype is bool:
+            column_types[col] = pa.bool_()
+        elif dtype == 'Int64':
+            column_types[col] = pa.int64()
+        else:
+            column_types[col] = pa.float64()
+    convert_options = pacsv.ConvertOptions(column_types=column_types, include_columns=columns,
+                                           strings_can_be_null=True)
+    reader = pacsv.open_csv(path, read_options=pacsv.ReadOptions(use_threads=True, column_names=column_names),
+                            convert_options=convert_options)
+
+    batches = []
+    buffered_rows = 0
+    start_row = 0
+    for batch in reader:
+        batches.append(batch)
+        buffered_rows += batch.num_rows
+        while buffered_rows >= chunksize:
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+            yield _to_chunk(table.slice(0, chunksize), start_row)
+            start_row += chunksize
+            remainder = table.slice(chunksize)
+            batches = remainder.to_batches()
+            buffered_rows = remainder.num_rows
+    if buffered_rows > 0:
+        yield _to_chunk(pa.Table.from_batches(batches, schema=reader.schema), start_row)
+
+# Convert an Arrow table into a pandas chunk indexed like the chunks of pd.read_csv
+def _to_chunk(table, start_row):
+    chunk = table.to_pandas()
+    chunk.index = pd.RangeIndex(start_row, start_row + len(chunk))
+    return chunk
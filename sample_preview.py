@@ -1,51 +1,83 @@
-import pandas as pd
+import argparse
 import time
+from multiprocessing import Pool
+import pandas as pd
+from cleaned_io import iter_cleaned
+from stream_profile import DatasetProfile
+
+# Profile of one chunk; partial profiles merge, so chunks can be profiled by several workers
+def profile_chunk(args):
+    start, chunk = args
+    profile = DatasetProfile()
+    profile.update(chunk, start)
+    return profile
+
+# Pair every chunk with the position of its first row in the file
+def numbered_chunks(chunks):
+    start = 0
+    for chunk in chunks:
+        yield start, chunk
+        start += len(chunk)
+
+# Single pass over the file that merges the chunk profiles into one
+def profile_file(path, chunk_size=100000, workers=1):
+    chunks = numbered_chunks(iter_cleaned(path=path, chunk_size=chunk_size))
+    profile = DatasetProfile()
+    if workers > 1:
+        with Pool(workers) as pool:
+            for partial in pool.imap_unordered(profile_chunk, chunks):
+                profile.merge(partial)
+    else:
+        for start, chunk in chunks:
+            profile.update(chunk, start)
+    return profile
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Profile a cleaned dataset in one streaming pass.")
+    parser.add_argument('--path', default="us_accidents_cleaned.csv", help="Cleaned CSV file or Parquet dataset")
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=1, help="Processes profiling chunks in parallel")
+    return parser.parse_args()
 
-start_time = time.time()
+def main():
+    args = parse_args()
+    start_time = time.time()
 
-# Load the sampled CSV file
-data = pd.read_csv("us_accidents_cleaned.csv")
+    profile = profile_file(args.path, chunk_size=args.chunk_size, workers=args.workers)
 
-# Columns
-print(list(data.columns))
+    # Columns
+    print(profile.columns)
 
-# Number of rows and columns
-num_rows, num_columns = data.shape
-print(f"Number of rows: {num_rows}")
-print(f"Number of columns: {num_columns}")
+    # Number of rows and columns
+    print(f"Number of rows: {profile.rows}")
+    print(f"Number of columns: {len(profile.columns)}")
 
-# Count and percentage of missing values per column (in original order)
-missing_values_count = data.isnull().sum()
-missing_values_percent = data.isnull().mean() * 100
-missing_values_df = pd.DataFrame({
-    'Missing Count': missing_values_count,
-    'Missing Percentage (%)': missing_values_percent
-})
+    # Count and percentage of missing values per column (in original order)
+    print("\nCount and Percentage of missing values per column:")
+    print(profile.missing())
 
-print("\nCount and Percentage of missing values per column:")
-print(missing_values_df)
+    # Number of unique values per column: exact up to 4096 of them, beyond that HyperLogLog with about 1% error
+    print("\nNumber of unique values per column:")
+    print(profile.unique_counts().sort_values(ascending=False))
 
-# Number of unique values per column
-unique_counts = data.nunique()
-print("\nNumber of unique values per column:")
-print(unique_counts.sort_values(ascending=False))
+    # Data types of each column
+    print("\nData types of each column:")
+    print(pd.Series(profile.dtypes)[profile.columns])
 
-# Data types of each column
-print("\nData types of each column:")
-print(data.dtypes)
+    # Basic statistics for numerical columns; quartiles come from a uniform sample of each column
+    print("\nBasic statistics for numerical columns:")
+    print(profile.describe_numeric())
 
-# Basic statistics for numerical columns
-print("\nBasic statistics for numerical columns:")
-print(data.describe())
+    # Basic statistics for categorical columns
+    print("\nBasic statistics for categorical columns:")
+    print(profile.describe_object())
 
-# Basic statistics for categorical columns
-categorical_columns = data.select_dtypes(include=['object']).columns
-print("\nBasic statistics for categorical columns:")
-print(data[categorical_columns].describe())
+    # Preview first few rows
+    print("\nPreview of the first few rows:")
+    print(profile.head)
 
-# Preview first few rows
-print("\nPreview of the first few rows:")
-print(data.head())
+    end_time = time.time()
+    print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
 
-end_time = time.time()
-print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import xgboost as xgb
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import random
+import heapq
+import argparse
+from functools import cached_property
+from tree_maximizer import TreeMaximizer
+from compiled_model import CompiledModel
+from stage_profiler import NullProfiler, add_profile_args, profiler_from_args, finish_profile
 
 class ModelOptimizer:
     def __init__(self, model_filename: str):
@@ -83,6 +89,11 @@ class ModelOptimizer:
             "Holiday", "After_Holiday", "Highway"
         ]
 
+    @cached_property
+    def compiled_model(self) -> CompiledModel:
+        """Flattened copy of the trees for scoring single samples without building a DMatrix, built on first use"""
+        return CompiledModel(self.model, self.feature_names)
+
     @staticmethod
     def load_model(model_filename: str) -> xgb.Booster:
         model = xgb.Booster()
@@ -114,8 +125,7 @@ class ModelOptimizer:
 
     def predict_sample(self, sample_df: pd.DataFrame) -> float:
         """Make prediction for a single sample"""
-        dmatrix = xgb.DMatrix(sample_df)
-        prediction = self.model.predict(dmatrix)
+        prediction = self.compiled_model.predict(sample_df)
         return prediction[0]
 
     def random_search(self, n_iterations: int, top_k: int = 5) -> List[Tuple[pd.DataFrame, float]]:
@@ -134,6 +144,84 @@ class ModelOptimizer:
         top_results = sorted(results, key=lambda x: x[1], reverse=True)[:top_k]
         return top_results
 
+    def generate_random_batch(self, n_samples: int, rng: np.random.Generator) -> np.ndarray:
+        """Generate n random samples at once as a float32 matrix in feature_names order"""
+        column_index = {feature: i for i, feature in enumerate(self.feature_names)}
+        batch = np.zeros((n_samples, len(self.feature_names)), dtype=np.float32)
+        
+        # Generate continuous variables
+        for feature, (min_val, max_val) in self.continuous_ranges.items():
+            if feature in column_index:
+                batch[:, column_index[feature]] = rng.uniform(min_val, max_val, n_samples)
+        
+        # Generate boolean variables
+        for feature in self.boolean_features:
+            if feature in column_index:
+                batch[:, column_index[feature]] = rng.integers(0, 2, n_samples)
+        
+        # Handle mutually exclusive categorical groups: exactly one column per group is set to 1
+        rows = np.arange(n_samples)
+        for group_name, features in self.categorical_groups.items():
+            group_columns = np.array([column_index[feature] for feature in features if feature in column_index])
+            chosen = rng.integers(0, len(group_columns), n_samples)
+            batch[rows, group_columns[chosen]] = 1
+        
+        return batch
+
+    def predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        """Make predictions for a whole batch with a single call"""
+        return self.model.inplace_predict(batch)
+
+    def batch_search(self, n_candidates: int, top_k: int = 5, batch_size: int = 100000,
+                     seed: Optional[int] = None, profiler=None) -> List[Tuple[pd.DataFrame, float]]:
+        """Perform batched random search and return top k results; each batch is profiled as one unit"""
+        if profiler is None:
+            profiler = NullProfiler()
+        rng = np.random.default_rng(seed)
+        # Min-heap of (prediction, candidate number, row) holding the best top_k candidates so far
+        heap = []
+        
+        for start in range(0, n_candidates, batch_size):
+            profiler.start('batch')
+            batch = self.generate_random_batch(min(batch_size, n_candidates - start), rng)
+            profiler.mark('Generate candidates', len(batch))
+            predictions = self.predict_batch(batch)
+            profiler.mark('Predict')
+            
+            # Only the batch's own top k can enter the heap
+            k = min(top_k, len(predictions))
+            for i in np.argpartition(predictions, -k)[-k:]:
+                item = (float(predictions[i]), start + int(i), batch[i])
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item[0] > heap[0][0]:
+                    heapq.heapreplace(heap, item)
+            profiler.mark('Update top k', len(heap))
+            
+            print(f"Completed {start + len(batch)} candidates. Current best: {max(heap)[0]}")
+        
+        # Sort by prediction value and return top k as single-row DataFrames
+        return [(self.row_to_sample(row), prediction)
+                for prediction, _, row in sorted(heap, key=lambda x: x[0], reverse=True)]
+
+    def exact_search(self, max_nodes: int = 100000) -> Tuple[pd.DataFrame, float, float]:
+        """Branch-and-bound search over the trees' split thresholds; returns (sample, prediction, gap)
+
+        The gap is how far the proven upper bound lies above the best sample; 0 means it is the true maximum.
+        """
+        maximizer = TreeMaximizer(self.model, self.feature_names, self.continuous_ranges,
+                                  self.boolean_features, self.categorical_groups)
+        best_row, best_value, upper_bound = maximizer.maximize(max_nodes=max_nodes)
+        prediction = float(self.predict_batch(best_row[np.newaxis, :])[0])
+        return self.row_to_sample(best_row), prediction, upper_bound - best_value
+
+    def row_to_sample(self, row: np.ndarray) -> pd.DataFrame:
+        """Turn one row of a batch into a single-row DataFrame like generate_random_sample returns"""
+        sample_df = pd.DataFrame([row], columns=self.feature_names)
+        flag_columns = [feature for feature in self.feature_names if feature not in self.continuous_ranges]
+        sample_df[flag_columns] = sample_df[flag_columns].astype(int)
+        return sample_df
+
     @staticmethod
     def print_result(sample_df: pd.DataFrame, prediction: float):
         """Pretty print a single result"""
@@ -150,8 +238,10 @@ class ModelOptimizer:
         # Print continuous variables
         continuous_vars = ["Temperature", "Humidity", "Pressure", "Visibility", 
                          "Wind_Speed", "Precipitation"]
+        # Columns the model does not have are skipped, such as Highway for a model trained on the cleaned data
         for var in continuous_vars:
-            print(f"{var}: {sample_df[var].iloc[0]:.2f}")
+            if var in sample_df.columns:
+                print(f"{var}: {sample_df[var].iloc[0]:.2f}")
         
         # Print non-zero boolean features
         boolean_features = ["Amenity", "Bump", "Crossing", "Give_Way",
@@ -159,20 +249,50 @@ class ModelOptimizer:
                           "Station", "Stop", "Traffic_Calming", 
                           "Traffic_Signal", "Holiday", "After_Holiday", "Highway"]
         for feature in boolean_features:
+            if feature not in sample_df.columns:
+                continue
             value = sample_df[feature].iloc[0]
             if value == 1:
                 print(f"{feature}: {value}")
 
+# Command line options for a search run
+def parse_args():
+    parser = argparse.ArgumentParser(description="Search for the inputs that maximize the model's prediction.")
+    parser.add_argument('--mode', choices=['random', 'exact'], default='random',
+                        help="Batched random search or branch and bound over the trees' split thresholds")
+    parser.add_argument('--max-nodes', type=int, default=100000,
+                        help="Regions the exact search may explore before it reports its best bound")
+    add_profile_args(parser, "search_profile")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    profiler = profiler_from_args(args)
+    
     # Initialize optimizer
+    profiler.start('setup')
     model_filename = "best_model_distance.xgb"
     optimizer = ModelOptimizer(model_filename)
+    profiler.mark('Load model')
+    
+    if args.mode == 'exact':
+        print(f"\nPerforming branch-and-bound search with up to {args.max_nodes} regions...")
+        profiler.start('exact search')
+        sample_df, prediction, gap = optimizer.exact_search(args.max_nodes)
+        profiler.mark('Branch and bound')
+        finish_profile(profiler, args)
+        status = "proven maximum" if gap == 0 else f"upper bound at most {gap} higher"
+        print(f"\nBest configuration found ({status}):")
+        optimizer.print_result(sample_df, prediction)
+        return
     
-    # Perform random search
-    n_iterations = 1000
+    # Perform batched random search
+    n_candidates = 10_000_000
+    batch_size = 100_000
     top_k = 5
-    print(f"\nPerforming random search with {n_iterations} iterations...")
-    top_results = optimizer.random_search(n_iterations, top_k)
+    print(f"\nPerforming random search with {n_candidates} candidates...")
+    top_results = optimizer.batch_search(n_candidates, top_k, batch_size, seed=0, profiler=profiler)
+    finish_profile(profiler, args)
     
     # Print top results
     print(f"\nTop {top_k} configurations found:")
@@ -0,0 +1,84 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from cleaned_io import iter_cleaned, required_columns, clear_parquet_dataset, one_hot_labels, model_feature_names
+
+# One-hot groups the attributions are broken down by
+breakdown_groups = {
+    'State': [col for col in required_columns if col.startswith('State_')],
+    'Weather': [col for col in required_columns if col.startswith('Weather_')]
+}
+
+# Exact TreeSHAP values of a chunk from the booster, plus the prediction they add up to
+def chunk_contributions(model, chunk):
+    feature_names = model_feature_names(model)
+    X = chunk.reindex(columns=feature_names, fill_value=0)
+    contributions = model.predict(xgb.DMatrix(X), pred_contribs=True)
+    frame = pd.DataFrame(contributions, columns=[f"SHAP_{feature}" for feature in feature_names] + ['SHAP_Bias'])
+    frame.insert(0, 'Prediction', contributions.sum(axis=1, dtype=np.float64).astype(np.float32))
+    return frame
+
+# Add the per-group sum of |SHAP| and row counts of a chunk to the running totals
+def accumulate(totals, kind, labels, abs_contributions):
+    sums = abs_contributions.groupby(labels).sum()
+    sums['Count'] = pd.Series(labels).value_counts()
+    totals[kind] = sums if kind not in totals else totals[kind].add(sums, fill_value=0)
+
+# Mean |SHAP| per feature for the whole dataset and for every state and weather category
+def summarize(totals):
+    frames = []
+    for kind, sums in totals.items():
+        means = sums.drop(columns=['Count']).div(sums['Count'], axis=0)
+        means.insert(0, 'Count', sums['Count'].astype(np.int64))
+        means.insert(0, 'Group', means.index.astype(str))
+        means.insert(0, 'Group_Type', kind)
+        frames.append(means.reset_index(drop=True))
+    return pd.concat(frames, ignore_index=True)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compute TreeSHAP attributions for the whole cleaned dataset.")
+    parser.add_argument('--model', default='best_model_distance.xgb', help="Trained booster to explain")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Rows explained per batch")
+    parser.add_argument('--output', default='shap_contributions.parquet',
+                        help="Directory of the per-row contribution dataset")
+    parser.add_argument('--summary', default='shap_summary.parquet', help="File of the per-group mean |SHAP|")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    start_time = time.time()
+
+    model = xgb.Booster()
+    model.load_model(args.model)
+
+    clear_parquet_dataset(args.output)
+    os.makedirs(args.output, exist_ok=True)
+
+    totals = {}
+    for part_index, chunk in enumerate(iter_cleaned(chunk_size=args.chunk_size)):
+        contributions = chunk_contributions(model, chunk)
+        contributions.to_parquet(os.path.join(args.output, f"part-{part_index:05d}.parquet"), index=False)
+
+        abs_contributions = contributions.drop(columns=['Prediction', 'SHAP_Bias']).abs()
+        accumulate(totals, 'All', np.full(len(chunk), 'All', dtype=object), abs_contributions)
+        for kind, columns in breakdown_groups.items():
+            accumulate(totals, kind, one_hot_labels(chunk, columns), abs_contributions)
+
+    summary = summarize(totals)
+    summary.to_parquet(args.summary, index=False)
+
+    # Print the overall share of every feature in the mean |SHAP|
+    overall = summary.loc[summary['Group_Type'] == 'All'].drop(columns=['Group_Type', 'Group', 'Count']).iloc[0]
+    percentages = (overall / overall.sum() * 100).sort_values(ascending=False)
+    print("Feature contributions in percentage (mean |SHAP| over all rows):")
+    for feature, percentage in percentages.items():
+        print(f"{feature[len('SHAP_'):]}: {percentage:.2f}%")
+
+    end_time = time.time()
+    print(f"Total processing time: {end_time - start_time:.2f} seconds ({(end_time - start_time)/60:.2f} minutes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+# Columns of a step record, in the order of the CSV report
+record_columns = ['unit', 'index', 'step', 'seconds', 'rows_in', 'rows_out', 'peak_memory_mb']
+
+class NullProfiler:
+    """Stands in for a StageProfiler when profiling is off; every hook does nothing."""
+
+    def start(self, unit, rows=None):
+        pass
+
+    def mark(self, step, rows=None):
+        pass
+
+    def merge(self, records):
+        pass
+
+class StageProfiler:
+    """Time, rows in and out and peak memory of the steps of repeated units of work, such as chunks.
+
+    start() begins a unit, and every mark() closes the step that ran since the previous start() or mark().
+    With memory='tracemalloc' the peak is the most memory Python and NumPy had allocated during the
+    step; with memory='rss' it is the process's peak resident size so far, so the step that raised it
+    stands out. memory=None only records times and rows.
+    """
+
+    def __init__(self, memory='rss'):
+        if memory not in ('tracemalloc', 'rss', None):
+            raise ValueError(f"Unknown memory measure: {memory}")
+        self.memory = memory
+        self.records = []
+        self.unit_counts = {}
+        self.unit = None
+        self.index = None
+        self.rows = None
+        self.last_time = None
+        if memory == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self, unit, rows=None):
+        """Begin the next unit of the given name, e.g. a chunk holding `rows` rows"""
+        self.unit_counts[unit] = self.unit_counts.get(unit, 0) + 1
+        self.unit = unit
+        self.index = self.unit_counts[unit]
+        self.rows = rows
+        if self.memory == 'tracemalloc':
+            tracemalloc.reset_peak()
+        self.last_time = time.perf_counter()
+
+    def mark(self, step, rows=None):
+        """Record the step that just finished; `rows` is its output row count when it changed"""
+        now = time.perf_counter()
+        rows_out = self.rows if rows is None else rows
+        self.records.append({'unit': self.unit, 'index': self.index, 'step': step, 'seconds': now - self.last_time,
+                             'rows_in': self.rows, 'rows_out': rows_out, 'peak_memory_mb': self._peak_memory()})
+        self.rows = rows_out
+        # The memory reading is left out of the next step's time
+        self.last_time = time.perf_counter()
+
+    def merge(self, records):
+        """Add the records of one unit profiled in a worker process, numbered as the next unit here.
+
+        The unit stays open, so steps the parent runs on the same unit are recorded with it.
+        """
+        if not records:
+            return
+        self.start(records[0]['unit'], records[-1]['rows_out'])
+        for record in records:
+            self.records.append({**record, 'index': self.index})
+
+    def _peak_memory(self):
+        if self.memory == 'tracemalloc':
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            return peak / 2**20
+        if self.memory == 'rss':
+            # ru_maxrss is in KiB on Linux and in bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+        return None
+
+    def steps(self):
+        steps = pd.DataFrame(self.records, columns=record_columns)
+        # Steps of units started without a row count have no rows
+        steps[['rows_in', 'rows_out']] = steps[['rows_in', 'rows_out']].astype('Int64')
+        return steps
+
+    def units(self):
+        """One row per unit: its total time, the rows it started and ended with and its highest peak"""
+        steps = self.steps()
+        grouped = steps.groupby(['unit', 'index'], sort=False)
+        return grouped.agg(seconds=('seconds', 'sum'), rows_in=('rows_in', 'first'), rows_out=('rows_out', 'last'),
+                           peak_memory_mb=('peak_memory_mb', 'max')).reset_index()
+
+    def summary(self):
+        """One row per step over all units, in the order the steps first ran"""
+        steps = self.steps()
+        grouped = steps.groupby(['unit', 'step'], sort=False)
+        summary = grouped.agg(count=('seconds', 'size'), seconds=('seconds', 'sum'), mean_ms=('seconds', 'mean'),
+                              rows_in=('rows_in', _sum_rows), rows_out=('rows_out', _sum_rows),
+                              peak_memory_mb=('peak_memory_mb', 'max')).reset_index()
+        summary['mean_ms'] *= 1000
+        summary['share_%'] = 100 * summary['seconds'] / summary.groupby('unit')['seconds'].transform('sum')
+        return summary
+
+    def write_report(self, path):
+        """Write every step record to <path>.csv and the records, unit totals and summary to <path>.json"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.steps().to_csv(path + ".csv", index=False)
+        report = {
+            'memory': self.memory,
+            'summary': _json_records(self.summary()),
+            'units': _json_records(self.units()),
+            'steps': self.records
+        }
+        with open(path + ".json", 'w') as file:
+            json.dump(report, file, indent=2, default=lambda value: value.item())
+
+    def print_summary(self):
+        memory = {'tracemalloc': "traced", 'rss': "RSS", None: None}[self.memory]
+        summary = self.summary()
+        if memory is None:
+            summary = summary.drop(columns=['peak_memory_mb'])
+        else:
+            summary = summary.rename(columns={'peak_memory_mb': f"peak_{memory}_mb"})
+        print("Time per step:")
+        print(summary.to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+        for unit, units in self.units().groupby('unit', sort=False):
+            slowest = units.loc[units['seconds'].idxmax()]
+            line = (f"{len(units)} x {unit}: {units['seconds'].mean():.2f} seconds on average, "
+                    f"slowest {unit} {slowest['index']} at {slowest['seconds']:.2f} seconds")
+            if memory is not None:
+                line += f", peak {memory} {units['peak_memory_mb'].max():.1f} MB"
+            print(line)
+
+def _sum_rows(rows):
+    return rows.sum(min_count=1)
+
+# Rows of a frame as dicts, with missing values as null instead of NaN, which is not valid JSON
+def _json_records(frame):
+    return frame.astype(object).where(frame.notna(), None).to_dict(orient='records')
+
+# Options shared by every script that can profile its steps
+def add_profile_args(parser, default_report):
+    parser.add_argument('--profile', action='store_true',
+                        help="Time every step and record its rows and peak memory, then print a summary")
+    parser.add_argument('--profile-memory', choices=['rss', 'tracemalloc', 'none'], default='rss',
+                        help="Peak memory measure; tracemalloc is per step but slows the run down")
+    parser.add_argument('--profile-report', default=default_report,
+                        help="Path of the .json and .csv profile reports, without the extension")
+
+def profiler_from_args(args):
+    if not args.profile:
+        return NullProfiler()
+    return StageProfiler(None if args.profile_memory == 'none' else args.profile_memory)
+
+# Print the summary and write the reports of a profiled run; does nothing when profiling was off
+def finish_profile(profiler, args):
+    if not isinstance(profiler, StageProfiler):
+        return
+    profiler.print_summary()
+    profiler.write_report(args.profile_report)
+    print(f"Profile written to {args.profile_report}.json and {args.profile_report}.csv")
@@ -1,19 +1,21 @@
-import pandas as pd
+from aggregate_cube import load_or_build_cube
 
-# Load your data
-df = pd.read_csv('us_accidents_sample_cleaned.csv')
+# Per-state counts and averages come from the aggregate cube (built on first use)
+# A state without rows has a count of 0 and NaN averages
+states = load_or_build_cube().rollup(['State'], State=['LA', 'SC']).reindex(['LA', 'SC'])
+states['Count'] = states['Count'].fillna(0).astype(int)
 
 # Count of 1's in 'State_LA' and 'State_SC'
-state_la_count = df['State_LA'].sum()
-state_sc_count = df['State_SC'].sum()
+state_la_count = states.loc['LA', 'Count']
+state_sc_count = states.loc['SC', 'Count']
 
 # Averages of 'Affected_Time' and 'Affected_Distance' for rows where 'State_LA' == 1
-state_la_affected_time_avg = df.loc[df['State_LA'] == 1, 'Affected_Time'].mean()
-state_la_affected_distance_avg = df.loc[df['State_LA'] == 1, 'Affected_Distance'].mean()
+state_la_affected_time_avg = states.loc['LA', 'Affected_Time_Mean']
+state_la_affected_distance_avg = states.loc['LA', 'Affected_Distance_Mean']
 
 # Averages of 'Affected_Time' and 'Affected_Distance' for rows where 'State_SC' == 1
-state_sc_affected_time_avg = df.loc[df['State_SC'] == 1, 'Affected_Time'].mean()
-state_sc_affected_distance_avg = df.loc[df['State_SC'] == 1, 'Affected_Distance'].mean()
+state_sc_affected_time_avg = states.loc['SC', 'Affected_Time_Mean']
+state_sc_affected_distance_avg = states.loc['SC', 'Affected_Distance_Mean']
 
 # Print results
 print(f"Count of 1's in 'State_LA': {state_la_count}")
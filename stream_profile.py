@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+
+# Mergeable single-pass summaries: every class has update(values) for one chunk and merge(other)
+# for the partial result of another chunk, so chunks can be profiled in any order or process.
+
+class HyperLogLog:
+    """Approximate distinct count with 2^p one-byte registers (about 1.04 / sqrt(2^p) relative error).
+
+    Like the sparse mode of HyperLogLog++, the distinct hashes themselves are kept until there are more
+    than 2^p / 4 of them, so a column with few distinct values gets an exact count instead of the
+    slightly biased small-range estimate.
+    """
+
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+        self.exact_limit = (1 << p) // 4
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update(self, values):
+        hashes = pd.util.hash_pandas_object(_hashable(values), index=False).to_numpy(dtype=np.uint64)
+        self._add_hashes(hashes)
+        buckets = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Rank = position of the first set bit of the remaining 64 - p bits
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        ranks = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if other.hashes is None:
+            self.hashes = None
+        else:
+            self._add_hashes(other.hashes)
+
+    def _add_hashes(self, hashes):
+        if self.hashes is None:
+            return
+        self.hashes = np.union1d(self.hashes, hashes)
+        if len(self.hashes) > self.exact_limit:
+            self.hashes = None
+
+    def estimate(self):
+        if self.hashes is not None:
+            return len(self.hashes)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        # Linear counting is more accurate for small cardinalities
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+# Values hash by dtype, so a value must be hashed as the same dtype in every chunk, whichever dtype the chunk
+# was read as: numbers (and booleans) as float64, with -0.0 as 0.0, and everything else as strings
+def _hashable(values):
+    if pd.api.types.is_bool_dtype(values.dtype) or pd.api.types.is_numeric_dtype(values.dtype):
+        return values.astype(np.float64) + 0.0
+    return values.astype(str)
+
+class QuantileSample:
+    """Bottom-k sample: the values with the k smallest random keys form a uniform sample of the stream."""
+
+    def __init__(self, size=20000):
+        self.size = size
+        self.keys = np.empty(0)
+        self.values = np.empty(0)
+
+    def update(self, values, rng):
+        values = np.asarray(values, dtype=np.float64)
+        self._keep(np.concatenate([self.keys, rng.random(len(values))]), np.concatenate([self.values, values]))
+
+    def merge(self, other):
+        self._keep(np.concatenate([self.keys, other.keys]), np.concatenate([self.values, other.values]))
+
+    def _keep(self, keys, values):
+        if len(keys) > self.size:
+            kept = np.argpartition(keys, self.size)[:self.size]
+            keys, values = keys[kept], values[kept]
+        self.keys, self.values = keys, values
+
+    def quantiles(self, qs):
+        if len(self.values) == 0:
+            return [np.nan for _ in qs]
+        return list(np.quantile(self.values, qs))
+
+class FrequentValues:
+    """Most frequent values, keeping only the largest `capacity` counts; a count is a lower bound of the true count."""
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+
+    def update(self, values):
+        self._add(values.value_counts(sort=False).to_dict())
+
+    def merge(self, other):
+        self._add(other.counts)
+
+    def _add(self, counts):
+        for value, count in counts.items():
+            self.counts[value] = self.counts.get(value, 0) + int(count)
+        if len(self.counts) > self.capacity:
+            # sorted() is stable, so on ties the values seen first are kept
+            kept = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:self.capacity]
+            self.counts = dict(kept)
+
+    def top(self):
+        if not self.counts:
+            return np.nan, np.nan
+        return max(self.counts.items(), key=lambda item: item[1])
+
+class ColumnProfile:
+    """Nulls, distinct count and either moments and quantiles (numeric) or frequent values (object)."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.count = 0
+        self.nulls = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.distinct = HyperLogLog()
+        self.sample = QuantileSample() if kind == 'numeric' else None
+        self.frequent = FrequentValues() if kind == 'object' else None
+
+    def update(self, series, rng):
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        self.distinct.update(values)
+        if self.kind == 'numeric' and len(values) > 0:
+            array = values.to_numpy(dtype=np.float64)
+            self._merge_moments(len(array), array.mean(), ((array - array.mean()) ** 2).sum(), array.min(), array.max())
+            self.sample.update(array, rng)
+        else:
+            self.count += len(values)
+            if self.kind == 'object':
+                self.frequent.update(values)
+
+    # Chan et al. parallel update of count, mean and sum of squared deviations
+    def _merge_moments(self, count, mean, m2, minimum, maximum):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def merge(self, other):
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        if self.kind == 'numeric':
+            if other.count > 0:
+                self._merge_moments(other.count, other.mean, other.m2, other.min, other.max)
+            self.sample.merge(other.sample)
+        else:
+            self.count += other.count
+            if self.kind == 'object':
+                self.frequent.merge(other.frequent)
+
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+def column_kind(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'bool'
+    if pd.api.types.is_numeric_dtype(dtype):
+        return 'numeric'
+    return 'object'
+
+class DatasetProfile:
+    """Profile of a whole table built from chunks; profiles of disjoint chunks merge into one."""
+
+    def __init__(self, head_rows=5):
+        self.head_rows = head_rows
+        self.rows = 0
+        self.columns = []
+        self.dtypes = {}
+        self.profiles = {}
+        self.head = None
+        self.head_start = None
+
+    def update(self, chunk, start=0):
+        """Add a chunk whose first row is row `start` of the table"""
+        # Random keys of the quantile sample depend only on the chunk's position, so runs are reproducible
+        rng = np.random.default_rng(start)
+        other = DatasetProfile(self.head_rows)
+        other.rows = len(chunk)
+        other.columns = list(chunk.columns)
+        other.dtypes = dict(chunk.dtypes)
+        other.head = chunk.head(self.head_rows)
+        other.head_start = start
+        for column in chunk.columns:
+            other.profiles[column] = ColumnProfile(column_kind(chunk[column].dtype))
+            other.profiles[column].update(chunk[column], rng)
+        self.merge(other)
+
+    def merge(self, other):
+        if not self.columns:
+            self.columns = other.columns
+        self.rows += other.rows
+        if other.head is not None and (self.head_start is None or other.head_start < self.head_start):
+            self.head, self.head_start = other.head, other.head_start
+        for column in other.columns:
+            if column not in self.profiles:
+                self.dtypes[column] = other.dtypes[column]
+                self.profiles[column] = other.profiles[column]
+                continue
+            # A column that reads as numeric in one chunk and object in another is an object column overall
+            mine, theirs = self.profiles[column], other.profiles[column]
+            if mine.kind != theirs.kind:
+                kind = 'object' if 'object' in (mine.kind, theirs.kind) else 'numeric'
+                self.dtypes[column] = np.dtype(object) if kind == 'object' else np.dtype(np.float64)
+                mine, theirs = _as_kind(mine, kind), _as_kind(theirs, kind)
+            elif mine.kind == 'numeric' and self.dtypes[column] != other.dtypes[column]:
+                self.dtypes[column] = np.promote_types(self.dtypes[column], other.dtypes[column])
+            mine.merge(theirs)
+            self.profiles[column] = mine
+
+    def missing(self):
+        nulls = pd.Series({column: self.profiles[column].nulls for column in self.columns})
+        return pd.DataFrame({'Missing Count': nulls, 'Missing Percentage (%)': nulls / self.rows * 100})
+
+    def unique_counts(self):
+        return pd.Series({column: self.profiles[column].distinct.estimate() for column in self.columns})
+
+    def describe_numeric(self):
+        stats = {}
+        for column in self.columns:
+            profile = self.profiles[column]
+            if profile.kind != 'numeric':
+                continue
+            q25, q50, q75 = profile.sample.quantiles([0.25, 0.5, 0.75])
+            empty = profile.count == 0
+            stats[column] = [profile.count, np.nan if empty else profile.mean, profile.std(),
+                             np.nan if empty else profile.min, q25, q50, q75, np.nan if empty else profile.max]
+        return pd.DataFrame(stats, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+
+    def describe_object(self):
+        stats = {}
+        for column in self.columns:
+            profile = self.profiles[column]
+            if profile.kind == 'object':
+                top, freq = profile.frequent.top()
+                stats[column] = [profile.count, profile.distinct.estimate(), top, freq]
+        return pd.DataFrame(stats, index=['count', 'unique', 'top', 'freq'], dtype=object)
+
+# Re-profile a partial column summary as another kind; numeric moments are dropped when it becomes an object column
+def _as_kind(profile, kind):
+    if profile.kind == kind:
+        return profile
+    converted = ColumnProfile(kind)
+    converted.count = profile.count
+    converted.nulls = profile.nulls
+    converted.distinct = profile.distinct
+    return converted
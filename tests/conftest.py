@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts are flat top-level modules, so make the repository importable from the tests
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import pandas as pd
+from test_cleaning import raw_sample, repo_dir, run_cleaning
+
+# The cube must follow the cleaned output when cleaning runs again, instead of answering from the old data
+def test_cube_is_rebuilt_after_cleaning(tmp_path, monkeypatch):
+    from aggregate_cube import load_or_build_cube
+
+    run_cleaning(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    assert load_or_build_cube().cells['Count'].sum() == len(pd.read_csv("us_accidents_sample_cleaned.csv"))
+
+    fewer_raw = tmp_path / "fewer_raw.csv"
+    pd.read_csv(raw_sample, dtype=str, keep_default_na=False).head(100).to_csv(fewer_raw, index=False)
+    run_cleaning(tmp_path, raw=fewer_raw)
+    assert load_or_build_cube().cells['Count'].sum() == len(pd.read_csv("us_accidents_sample_cleaned.csv"))
+
+# Without any LA or SC rows the comparison reports counts of 0, as the script did before the cube
+def test_state_comparison_without_the_states(tmp_path):
+    raw = pd.read_csv(raw_sample, dtype=str, keep_default_na=False)
+    raw['State'] = 'CA'
+    ca_raw = tmp_path / "ca_raw.csv"
+    raw.to_csv(ca_raw, index=False)
+    run_cleaning(tmp_path, raw=ca_raw)
+
+    result = subprocess.run([sys.executable, os.path.join(repo_dir, "state_comparison.py")], cwd=tmp_path,
+                            check=True, capture_output=True, text=True)
+    assert "Count of 1's in 'State_LA': 0" in result.stdout
+    assert "Count of 1's in 'State_SC': 0" in result.stdout
+
+# weather_dict.py and wind_dict.py count the categories cleaning mapped the raw values into
+def test_category_counts_come_from_the_cube(tmp_path):
+    run_cleaning(tmp_path)
+    cleaned = pd.read_csv(tmp_path / "us_accidents_sample_cleaned.csv")
+
+    def run_script(name):
+        return subprocess.run([sys.executable, os.path.join(repo_dir, name)], cwd=tmp_path,
+                              check=True, capture_output=True, text=True).stdout
+
+    weather = run_script("weather_dict.py")
+    for column in cleaned.filter(like='Weather_').columns:
+        assert f"{column.split('_', 1)[1].upper()}: {cleaned[column].sum()}" in weather
+    weather_na = (cleaned.filter(like='Weather_').sum(axis=1) == 0).sum()
+    assert f"NA: {weather_na}" in weather
+
+    wind = run_script("wind_dict.py")
+    for column in cleaned.filter(like='WindDir_').columns:
+        assert f"\n{column.split('_', 1)[1]}: {cleaned[column].sum()}" in wind
+    assert f"NA: {(cleaned.filter(like='WindDir_').sum(axis=1) == 0).sum()}" in wind
+
+def test_cube_of_no_rows_is_empty(tmp_path):
+    from aggregate_cube import AggregateCube, build_cube
+
+    cube = AggregateCube(build_cube([]))
+    cube.save(str(tmp_path / "cube.parquet"))
+    states = AggregateCube.load(str(tmp_path / "cube.parquet")).rollup(['State'], State=['LA'])
+    assert len(cube.cells) == 0 and len(states) == 0
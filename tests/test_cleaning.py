@@ -0,0 +1,146 @@
+import os
+import subprocess
+import sys
+from collections import deque
+import numpy as np
+import pandas as pd
+import pytest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+data_dir = os.path.join(repo_dir, "tests", "data")
+
+# 300 raw records, including midnight, New Year and leap-day edges around holidays
+raw_sample = os.path.join(data_dir, "us_accidents_raw_sample.csv")
+# Output of the baseline cleaning.py (before the vectorized date and holiday steps) on raw_sample, in one
+# chunk and in chunks of 100 and 3 records. Each chunk formats a mapped column as 0/1 or, if it had NaNs, as
+# 0.0/1.0, so the bytes depend on the chunk boundaries and each run is compared with the same chunking.
+golden_outputs = {
+    100000: os.path.join(data_dir, "us_accidents_cleaned_golden.csv"),
+    100: os.path.join(data_dir, "us_accidents_cleaned_golden_chunk100.csv"),
+    3: os.path.join(data_dir, "us_accidents_cleaned_golden_chunk3.csv")
+}
+
+# Run cleaning.py in a scratch directory
+def run_cleaning(directory, *options, raw=raw_sample):
+    subprocess.run([sys.executable, os.path.join(repo_dir, "cleaning.py"), "--input", str(raw), *options],
+                   cwd=directory, check=True, capture_output=True)
+
+def read_cleaned_csv(directory):
+    with open(os.path.join(directory, "us_accidents_sample_cleaned.csv"), "rb") as file:
+        return file.read()
+
+def read_golden(chunk_size):
+    with open(golden_outputs[chunk_size], "rb") as file:
+        return file.read()
+
+@pytest.mark.parametrize("chunk_size, workers", [(100000, 1), (100, 1), (100, 2), (3, 1)])
+def test_cleaned_output_matches_baseline(tmp_path, chunk_size, workers):
+    run_cleaning(tmp_path, "--chunk-size", str(chunk_size), "--workers", str(workers))
+    assert read_cleaned_csv(tmp_path) == read_golden(chunk_size)
+
+# After a Parquet run and then a CSV run, readers must load the CSV rather than the older Parquet dataset
+def test_readers_follow_latest_output(tmp_path, monkeypatch):
+    from cleaned_io import default_cleaned_path, read_cleaned, cleaned_csv_path, cleaned_parquet_path
+
+    run_cleaning(tmp_path, "--format", "parquet")
+    monkeypatch.chdir(tmp_path)
+    assert default_cleaned_path() == cleaned_parquet_path
+    run_cleaning(tmp_path, "--chunk-size", "100")
+    assert default_cleaned_path() == cleaned_csv_path
+    assert len(read_cleaned(columns=['Affected_Time'])) == read_golden(100).count(b"\n") - 1
+
+# Wind_Direction and Weather_Condition are read as categoricals. When every category of a chunk maps to a
+# different value, mapping gives another categorical, and its missing values must still get the '' fill of step 3
+def test_chunk_whose_categories_all_map(tmp_path):
+    tiny = pd.read_csv(raw_sample, dtype=str, keep_default_na=False).head(3)
+    tiny['Wind_Direction'] = ['E', 'S', '']
+    tiny['Weather_Condition'] = ['Cloudy', 'Rain', '']
+    tiny_raw = tmp_path / "tiny_raw.csv"
+    tiny.to_csv(tiny_raw, index=False)
+
+    run_cleaning(tmp_path, raw=tiny_raw)
+    cleaned = pd.read_csv(tmp_path / "us_accidents_sample_cleaned.csv")
+    assert list(cleaned.columns) == list(pd.read_csv(golden_outputs[100000], nrows=0).columns)
+    assert cleaned.loc[0, 'WindDir_E'] == 1 and cleaned.loc[0, 'Weather_Cloudy'] == 1
+    assert (cleaned.filter(like='Weather_').sum(axis=1) <= 1).all()
+
+# A run without --feature-store leaves the store of an earlier run behind, which must not be used anymore
+def test_stale_feature_store_is_not_current(tmp_path, monkeypatch):
+    from cleaned_io import has_feature_store, has_current_feature_store
+
+    run_cleaning(tmp_path, "--feature-store")
+    monkeypatch.chdir(tmp_path)
+    assert has_current_feature_store()
+    run_cleaning(tmp_path)
+    assert has_feature_store() and not has_current_feature_store()
+
+# Rows appended to a source while it is being cleaned are left for the next run, which starts at the recorded size
+@pytest.mark.parametrize("engine", ['c', 'pyarrow'])
+def test_source_appended_mid_run_is_read_to_its_starting_size(tmp_path, engine):
+    from cleaning import read_pending_sources
+
+    with open(raw_sample) as file:
+        header = file.readline()
+        records = file.read()
+    # Large enough that the parsers cannot have buffered the whole file before the append
+    source = str(tmp_path / "raw.csv")
+    with open(source, "w") as file:
+        file.write(header + records * 20)
+    size = os.path.getsize(source)
+
+    chunks = read_pending_sources([(source, 0)], {source: size}, 100, engine, deque())
+    rows = len(next(chunks))
+    with open(source, "a") as file:
+        file.write(records * 20)
+    rows += sum(len(chunk) for chunk in chunks)
+    assert rows == 300 * 20
+
+class Interrupted(Exception):
+    pass
+
+# An incremental run killed after appending some chunks, then rerun with --no-resume or resumed, must leave
+# exactly the output of one clean run over all records, in the cleaned data and in the feature store
+@pytest.mark.parametrize("output_format, rerun_options", [('csv', ["--no-resume"]), ('parquet', ["--no-resume"]),
+                                                          ('csv', [])])
+def test_interrupted_incremental_run_rerun(tmp_path, monkeypatch, output_format, rerun_options):
+    import cleaning
+    from cleaned_io import CleanedOutput, read_cleaned, open_feature_store, has_current_feature_store
+
+    with open(raw_sample) as file:
+        lines = file.readlines()
+    source = tmp_path / "raw.csv"
+    source.write_text("".join(lines[:151]))
+    options = ["--format", output_format, "--feature-store", "--chunk-size", "10"]
+    run_cleaning(tmp_path, *options, raw=source)
+
+    # The appending run stops after its third chunk is written, as if it was killed
+    with open(source, "a") as file:
+        file.write("".join(lines[151:]))
+    write = CleanedOutput.write
+    written = []
+    def write_then_stop(self, chunk):
+        write(self, chunk)
+        written.append(len(chunk))
+        if len(written) == 3:
+            raise Interrupted()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(CleanedOutput, "write", write_then_stop)
+    monkeypatch.setattr(sys, "argv", ["cleaning.py", "--input", str(source), "--incremental", *options])
+    with pytest.raises(Interrupted):
+        cleaning.main()
+    monkeypatch.undo()
+
+    run_cleaning(tmp_path, *options, "--incremental", *rerun_options, raw=source)
+    full_dir = tmp_path / "full"
+    full_dir.mkdir()
+    run_cleaning(full_dir, *options, raw=source)
+
+    monkeypatch.chdir(tmp_path)
+    assert has_current_feature_store()
+    features, targets, _ = open_feature_store()
+    cleaned = read_cleaned()
+    monkeypatch.chdir(full_dir)
+    full_features, full_targets, _ = open_feature_store()
+    pd.testing.assert_frame_equal(cleaned, read_cleaned(), check_dtype=False)
+    np.testing.assert_array_equal(features, full_features)
+    np.testing.assert_array_equal(targets['Affected_Time'], full_targets['Affected_Time'])
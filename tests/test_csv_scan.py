@@ -0,0 +1,62 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from csv_scan import count_csv_records, record_offset
+
+def make_rows(count=300):
+    rng = np.random.default_rng(3)
+    # Descriptions with quoted commas, newlines and escaped quotes; enough quotes to wrap a uint8 count
+    descriptions = rng.choice(['Plain text', 'Lane blocked, use caution', 'Two\nlines', 'Says ""stop""\non I-5', ''],
+                              count)
+    return pd.DataFrame({'ID': [f"A-{i}" for i in range(count)], 'Description': descriptions,
+                         'Distance(mi)': rng.random(count).round(3)})
+
+def write_csv(path, rows, line_terminator='\n', final_newline=True):
+    text = rows.to_csv(index=False, lineterminator=line_terminator)
+    if not final_newline:
+        text = text[:-len(line_terminator)]
+    path.write_bytes(text.encode())
+    return path
+
+layouts = [('\n', True), ('\r\n', True), ('\n', False), ('\r\n', False)]
+
+@pytest.mark.parametrize("line_terminator, final_newline", layouts)
+@pytest.mark.parametrize("block_size", [5, 64, 1 << 24])
+def test_count_matches_pandas(tmp_path, line_terminator, final_newline, block_size):
+    rows = make_rows()
+    path = write_csv(tmp_path / 'rows.csv', rows, line_terminator, final_newline)
+    assert len(pd.read_csv(path)) == len(rows)
+    assert count_csv_records(path, block_size=block_size, threads=3) == len(rows) + 1
+
+def test_count_small_files(tmp_path):
+    (tmp_path / 'empty.csv').write_bytes(b'')
+    (tmp_path / 'header.csv').write_bytes(b'ID,Description')
+    (tmp_path / 'quoted.csv').write_bytes(b'ID,Description\n1,"a\nb\nc"\n2,"""x"""')
+    assert count_csv_records(tmp_path / 'empty.csv') == 0
+    assert count_csv_records(tmp_path / 'header.csv') == 1
+    assert count_csv_records(tmp_path / 'quoted.csv', block_size=3) == 3
+
+@pytest.mark.parametrize("line_terminator, final_newline", layouts)
+@pytest.mark.parametrize("block_size", [7, 1 << 24])
+def test_record_offset_skips_whole_records(tmp_path, line_terminator, final_newline, block_size):
+    rows = make_rows(120)
+    path = write_csv(tmp_path / 'rows.csv', rows, line_terminator, final_newline)
+    data = path.read_bytes()
+    expected = pd.read_csv(path)
+    header_end = record_offset(path, 0, 1, block_size=block_size)
+    assert data[:header_end] == f"ID,Description,Distance(mi){line_terminator}".encode()
+    for skipped in [0, 1, 37, 119]:
+        offset = record_offset(path, header_end, skipped, block_size=block_size)
+        rest = pd.read_csv(io.BytesIO(data[offset:]), names=list(rows.columns), header=None)
+        pd.testing.assert_frame_equal(rest, expected.iloc[skipped:].reset_index(drop=True))
+    # Offsets chain: skipping 30 then 7 records lands where skipping 37 does
+    middle = record_offset(path, header_end, 30, block_size=block_size)
+    assert record_offset(path, middle, 7, block_size=block_size) == record_offset(path, header_end, 37, block_size=block_size)
+
+def test_record_offset_past_the_end(tmp_path):
+    path = write_csv(tmp_path / 'rows.csv', make_rows(10), final_newline=False)
+    size = path.stat().st_size
+    assert record_offset(path, 0, 11) == size
+    assert record_offset(path, 0, 50) == size
+    assert record_offset(path, size, 1) == size
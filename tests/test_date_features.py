@@ -0,0 +1,45 @@
+import collections
+import numpy as np
+import pandas as pd
+from workalendar.usa import UnitedStates
+from cleaning import process_chunk, build_holidays_dict
+from raw_io import read_raw, cleaning_columns
+from test_cleaning import raw_sample
+
+# Year ends, leap days, midnight and holidays observed on another day, some of them in the previous year
+edge_times = [
+    '2016-02-29 12:00:00', '2016-12-31 23:59:59', '2017-01-01 00:00:00', '2017-01-02 08:30:00',
+    '2019-07-04 23:00:00', '2019-07-05 01:00:00', '2020-11-27 00:00:01', '2021-12-31 10:00:00',
+    '2022-01-01 00:00:00', '2022-01-03 07:15:30', '2023-12-26 00:00:00', '2024-12-31 23:59:59'
+]
+
+# The per-row date and holiday features process_chunk computed before they were vectorized
+def reference_features(start_time, holiday_sets):
+    day_of_year = pd.Timestamp(year=start_time.year, month=start_time.month, day=start_time.day).day_of_year
+    year = start_time.year
+    days_in_year = 366 if ((year % 4 == 0) and (year % 100 != 0 or year % 400 == 0)) else 365
+    seconds_in_day = start_time.hour * 3600 + start_time.minute * 60 + start_time.second
+    return {'Percentage_of_Year': day_of_year / days_in_year, 'Percentage_of_Day': seconds_in_day / 86400,
+            'Holiday': int(start_time.date() in holiday_sets[year]),
+            'After_Holiday': int((start_time - pd.Timedelta(days=1)).date() in holiday_sets[year])}
+
+def test_vectorized_date_features_match_the_per_row_version():
+    cal = UnitedStates()
+    holiday_sets = {year: {holiday[0] for holiday in cal.holidays(year)} for year in range(2015, 2025)}
+    chunk = read_raw(raw_sample, columns=cleaning_columns)
+    start_times = pd.Series([edge_times[i % len(edge_times)] for i in range(len(chunk))], index=chunk.index)
+    chunk['Start_Time'] = start_times
+    chunk['End_Time'] = (pd.to_datetime(start_times) + pd.Timedelta(minutes=30)).dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Every raw wind and weather value maps, so no row is dropped for them
+    cleaned = process_chunk(chunk, build_holidays_dict(cal, 2015, 2024), collections.defaultdict(lambda: 'N'),
+                            collections.defaultdict(lambda: 'Clear'), numeric_output=True)
+    assert set(start_times[cleaned.index]) == set(edge_times)
+
+    expected = pd.DataFrame([reference_features(pd.Timestamp(start_times[i]), holiday_sets) for i in cleaned.index],
+                            index=cleaned.index)
+    for column in ['Percentage_of_Year', 'Percentage_of_Day']:
+        np.testing.assert_array_equal(cleaned[column].to_numpy(), expected[column].round(6).to_numpy())
+    for column in ['Holiday', 'After_Holiday']:
+        np.testing.assert_array_equal(cleaned[column].to_numpy(), expected[column].to_numpy())
+    assert expected['Holiday'].sum() > 0 and expected['After_Holiday'].sum() > 0
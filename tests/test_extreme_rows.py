@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from extreme_rows import StreamingExtremes, prepare_chunk
+
+def make_rows(count=3000):
+    rng = np.random.default_rng(9)
+    rows = pd.DataFrame({'ID': [f"A-{i}" for i in range(count)],
+                         'State': rng.choice(['CA', 'TX', 'RI'], count, p=[0.6, 0.38, 0.02]),
+                         # Distinct values so the expected ranking has no ties
+                         'Affected_Time': rng.permutation(count).astype(float) * 500,
+                         'Affected_Distance': rng.permutation(count) / 100})
+    rows.loc[rows.index % 97 == 0, 'Affected_Distance'] = np.nan
+    return rows
+
+def chunked(rows, size):
+    return (rows.iloc[start:start + size] for start in range(0, len(rows), size))
+
+def expected_ids(rows, metric, direction, k):
+    values = rows[metric].dropna()
+    if metric == 'Affected_Time':
+        values = values[values < 1000000]
+    values = values.nlargest(k) if direction == 'top' else values.nsmallest(k)
+    return list(rows.loc[values.index, 'ID'])
+
+@pytest.mark.parametrize("chunk_size", [29, 250, 3000])
+def test_extremes_match_the_whole_frame(chunk_size):
+    rows = make_rows()
+    extremes = StreamingExtremes(['Affected_Time', 'Affected_Distance'], k=5, group_by='State')
+    for chunk in chunked(rows, chunk_size):
+        extremes.update(chunk)
+    results = extremes.results()
+    for metric in ['Affected_Time', 'Affected_Distance']:
+        for direction in ['top', 'bottom']:
+            for group, group_rows in [('(all)', rows)] + list(rows.groupby('State')):
+                kept = results[(results['Metric'] == metric) & (results['Direction'] == direction) &
+                               (results['Group'] == group)].sort_values('Rank')
+                assert list(kept['ID']) == expected_ids(group_rows, metric, direction, 5)
+                assert list(kept['Rank']) == list(range(1, len(kept) + 1))
+
+def test_values_over_the_limit_and_missing_values_are_not_ranked():
+    rows = make_rows()
+    extremes = StreamingExtremes(['Affected_Time', 'Affected_Distance'], k=3, bottom=False)
+    for chunk in chunked(rows, 400):
+        extremes.update(chunk)
+    assert extremes.best_row('Affected_Time')['Affected_Time'] < 1000000
+    assert not extremes.best_row('Affected_Distance')[['Affected_Distance']].isna().any()
+    assert set(extremes.results()['Direction']) == {'top'}
+    assert extremes.best_row('Affected_Time', 'bottom') is None
+
+def test_best_row_is_rank_one():
+    rows = make_rows()
+    extremes = StreamingExtremes(['Affected_Distance'], k=4)
+    for chunk in chunked(rows, 333):
+        extremes.update(chunk)
+    assert extremes.best_row('Affected_Distance')['ID'] == expected_ids(rows, 'Affected_Distance', 'top', 1)[0]
+    assert extremes.best_row('Affected_Distance', 'bottom')['ID'] == expected_ids(rows, 'Affected_Distance', 'bottom', 1)[0]
+
+def test_prepare_chunk_skips_excluded_ids():
+    chunk = pd.DataFrame({'ID': ['A-1', 'A-2', 'A-3'],
+                          'Start_Time': ['2016-02-08 05:46:00', '2016-02-08 06:07:59.000000000', 'bad'],
+                          'End_Time': ['2016-02-08 11:00:00', '2016-02-08 06:37:59', '2016-02-08 06:37:59'],
+                          'Distance(mi)': [0.01, 0.5, 2.0]})
+    prepared = prepare_chunk(chunk, ['Affected_Time', 'Affected_Distance'], {'A-2'})
+    assert list(prepared['ID']) == ['A-1', 'A-3']
+    assert prepared['Affected_Time'].iloc[0] == 5 * 3600 + 14 * 60
+    assert np.isnan(prepared['Affected_Time'].iloc[1])
+    assert list(prepared['Affected_Distance']) == [0.01, 2.0]
+    assert 'Affected_Time' not in chunk
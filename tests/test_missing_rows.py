@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+import missing_rows
+from missing_rows import profile_missing_patterns, missing_buckets
+
+def make_rows(count=2000):
+    rng = np.random.default_rng(11)
+    # 11 columns so every row mask spans two packed bytes
+    rows = pd.DataFrame({f"C{i}": rng.random(count) for i in range(10)})
+    rows['State'] = rng.choice(['CA', 'TX'], count).astype(object)
+    for i, column in enumerate(rows.columns):
+        rows.loc[rng.random(count) < 0.05 * (i % 4), column] = None
+    return rows
+
+def chunked(rows, size):
+    return (rows.iloc[start:start + size] for start in range(0, len(rows), size))
+
+def expected_buckets(rows):
+    nulls = rows.isnull()
+    missing = nulls.sum(axis=1)
+    return {int(count): (int((missing == count).sum()), nulls[missing == count].sum().to_numpy())
+            for count in sorted(missing.unique())}
+
+@pytest.mark.parametrize("chunk_size", [1, 300, 2000])
+def test_buckets_match_the_whole_frame(chunk_size):
+    rows = make_rows()
+    columns, pattern_counts, total_rows = profile_missing_patterns(chunked(rows, chunk_size))
+    assert columns == list(rows.columns)
+    assert total_rows == len(rows) == sum(pattern_counts.values())
+    assert len(pattern_counts) == len(rows.isnull().drop_duplicates())
+    buckets = missing_buckets(columns, pattern_counts)
+    expected = expected_buckets(rows)
+    assert list(buckets) == list(expected)
+    for missing, (count, column_counts) in expected.items():
+        assert buckets[missing][0] == count
+        assert list(buckets[missing][1]) == list(column_counts)
+
+def test_complete_rows_are_bucket_zero():
+    rows = make_rows(50).fillna(0)
+    columns, pattern_counts, total_rows = profile_missing_patterns(chunked(rows, 20))
+    buckets = missing_buckets(columns, pattern_counts)
+    assert list(buckets) == [0] and buckets[0][0] == 50 and not buckets[0][1].any()
+
+def test_main_prints_the_buckets(tmp_path, monkeypatch, capsys):
+    rows = pd.DataFrame({'A': [1, None, None, 4], 'B': ['x', 'y', None, 'z'], 'C': [1.5, 2.5, 3.5, None]})
+    rows.to_csv(tmp_path / 'us_accidents_cleaned.csv', index=False)
+    monkeypatch.chdir(tmp_path)
+    missing_rows.main()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:-1] == ["Missing 0 columns: 25.00000% of rows.",
+                          "Missing 1 column: 50.00000% of rows.",
+                          "  Most common: 'A' - 50.0%, 'C' - 50.0%",
+                          "Missing 2 columns: 25.00000% of rows.",
+                          "  Most common: 'A' - 100.0%, 'B' - 100.0%"]
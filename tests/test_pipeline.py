@@ -0,0 +1,33 @@
+from pipeline import Stage, stages, select_stages, stage_dependencies, stage_key, run_stage, FileHasher
+
+# A default run leaves out the stages whose inputs no stage writes, but they still run when asked for
+def test_default_run_leaves_out_optional_stages():
+    dependencies = stage_dependencies(stages)
+    default = [stage.name for stage in select_stages(stages, [], dependencies)]
+    assert 'cleaner' not in default and 'max_time' not in default
+    assert [stage.name for stage in select_stages(stages, ['max_time'], dependencies)] == \
+           ['feature_importance', 'cleaner', 'max_time']
+
+# Training reads the feature store or the cleaned output of the last run, so its key follows that file
+def test_train_key_follows_the_file_it_reads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    current = {'path': "first.csv"}
+    (tmp_path / "first.csv").write_text("a\n1\n")
+    (tmp_path / "second.csv").write_text("a\n2\n")
+    stage = Stage('train', 'train_model.py', inputs=[lambda: current['path']])
+    hasher = FileHasher()
+
+    first_key = stage_key(stage, hasher)
+    current['path'] = "second.csv"
+    assert stage_key(stage, hasher) != first_key
+
+def test_readers_of_the_cleaned_output_depend_on_clean():
+    dependencies = stage_dependencies(stages)
+    for name in ['train', 'shap', 'cube', 'profile']:
+        assert 'clean' in dependencies[name]
+
+# Stage scripts are relative to the repository, so they must run there whatever directory the pipeline is run from
+def test_stage_runs_in_the_repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    returncode, _ = run_stage(Stage('noop', 'stage_profiler.py'))
+    assert returncode == 0
@@ -0,0 +1,80 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+from cleaned_io import feature_columns
+from prediction_server import make_server, request_predictions
+from test_cleaning import golden_outputs
+
+# Highway is a feature of the shipped model that the cleaned data does not have
+named_features = ['Temperature', 'Humidity', 'Junction', 'Highway']
+
+# Cleaned rows as a client sends them: every column of the cleaned data, targets and Source included
+def cleaned_records(rows=5):
+    return json.loads(pd.read_csv(golden_outputs[100000], nrows=rows).to_json(orient='records'))
+
+def train_booster(X):
+    rng = np.random.default_rng(0)
+    return xgb.train({'max_depth': 2}, xgb.DMatrix(X, label=rng.uniform(0, 1, len(X))), num_boost_round=3)
+
+# Serves boosters on free ports and stops them after the test
+@pytest.fixture
+def serve(tmp_path):
+    servers = []
+
+    def start(model):
+        path = str(tmp_path / f"model{len(servers)}.json")
+        model.save_model(path)
+        server = make_server(path, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def post_rows_expect_error(url, rows):
+    request = urllib.request.Request(f"{url}/predict", data=json.dumps({'rows': rows}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request)
+    return error.value.code, json.loads(error.value.read())
+
+@pytest.fixture
+def named_model():
+    X = pd.DataFrame(np.random.default_rng(1).uniform(0, 1, (200, len(named_features))), columns=named_features)
+    return train_booster(X)
+
+def test_cleaned_rows_are_predicted(serve, named_model):
+    url = serve(named_model)
+    records = cleaned_records()
+    expected = named_model.inplace_predict(
+        pd.DataFrame(records).reindex(columns=named_features, fill_value=0).to_numpy(dtype=np.float32))
+    np.testing.assert_allclose(request_predictions(url, records), expected)
+
+def test_features_missing_from_a_row_are_0(serve, named_model):
+    url = serve(named_model)
+    rows = [{'Temperature': 0.2}, {'Temperature': 0.2, 'Humidity': 0, 'Junction': 0, 'Highway': 0}]
+    predictions = request_predictions(url, rows)
+    assert predictions[0] == predictions[1]
+
+def test_unknown_key_is_rejected(serve, named_model):
+    url = serve(named_model)
+    status, body = post_rows_expect_error(url, [{'Temperature': 0.2, 'Temprature': 0.5}])
+    assert status == 400
+    assert 'Temprature' in body['error']
+
+# A booster saved without feature names was trained on the cleaned feature columns in order
+def test_booster_without_feature_names(serve):
+    model = train_booster(np.random.default_rng(2).uniform(0, 1, (200, len(feature_columns))))
+    assert model.feature_names is None
+    url = serve(model)
+    records = cleaned_records()
+    expected = model.inplace_predict(pd.DataFrame(records)[feature_columns].to_numpy(dtype=np.float32))
+    np.testing.assert_allclose(request_predictions(url, records), expected)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from random_sample import reservoir_sample
+
+def make_rows(count=10000):
+    rng = np.random.default_rng(5)
+    # State 'RI' is rare: 20 of the rows
+    states = np.where(np.arange(count) % 500 == 0, 'RI', rng.choice(['CA', 'TX', 'FL'], count))
+    return pd.DataFrame({'ID': [f"A-{i}" for i in range(count)], 'State': states,
+                         'Start_Time': [f"{2016 + i % 8}-01-01 00:00:00" for i in range(count)]})
+
+def chunked(rows, size):
+    return (rows.iloc[start:start + size] for start in range(0, len(rows), size))
+
+@pytest.mark.parametrize("stratify", [None, 'State'])
+def test_sample_does_not_depend_on_chunk_size(stratify):
+    rows = make_rows()
+    whole = reservoir_sample([rows], 300, seed=3, stratify=stratify, min_per_stratum=10)
+    for size in [1000, 777]:
+        pd.testing.assert_frame_equal(reservoir_sample(chunked(rows, size), 300, seed=3, stratify=stratify,
+                                                       min_per_stratum=10), whole)
+
+def test_sample_is_n_distinct_rows_of_the_input():
+    rows = make_rows()
+    sample = reservoir_sample(chunked(rows, 1000), 500, seed=1)
+    assert len(sample) == 500 and sample['ID'].is_unique
+    assert sample['ID'].isin(rows['ID']).all()
+    # Row positions of a uniform sample average out near the middle of the input
+    positions = sample['ID'].str[2:].astype(int)
+    assert abs(positions.mean() - len(rows) / 2) < 0.1 * len(rows)
+
+def test_input_smaller_than_n_is_kept_whole():
+    rows = make_rows(50)
+    assert sorted(reservoir_sample(chunked(rows, 7), 100)['ID']) == sorted(rows['ID'])
+    assert reservoir_sample([], 100).empty
+
+def test_stratified_sample_keeps_rare_strata():
+    rows = make_rows()
+    plain = reservoir_sample(chunked(rows, 1000), 100, seed=2)
+    stratified = reservoir_sample(chunked(rows, 1000), 100, seed=2, stratify='State', min_per_stratum=15)
+    assert (plain['State'] == 'RI').sum() < 15
+    counts = stratified['State'].value_counts()
+    assert counts['RI'] == 15 and (counts >= 15).all()
+    assert len(stratified) == 100
+
+def test_stratum_smaller_than_the_minimum_is_kept_whole():
+    rows = make_rows()
+    sample = reservoir_sample(chunked(rows, 1000), 100, seed=2, stratify='State', min_per_stratum=30)
+    assert (sample['State'] == 'RI').sum() == 20
+
+def test_years_as_strata():
+    sample = reservoir_sample(chunked(make_rows(), 1000), 40, seed=4, stratify='year', min_per_stratum=5)
+    assert (sample['Start_Time'].str[:4].value_counts() >= 5).all()
+    assert sample['Start_Time'].str[:4].nunique() == 8
@@ -0,0 +1,11 @@
+import pandas as pd
+from cleaned_io import feature_columns
+from search_model import ModelOptimizer
+
+# A model trained on the cleaned data has no Highway column, which print_result used to look up
+def test_result_of_a_model_without_highway(capsys):
+    sample = pd.DataFrame([[0] * len(feature_columns)], columns=feature_columns)
+    sample[['Temperature', 'Junction', 'State_CA']] = [70.5, 1, 1]
+    ModelOptimizer.print_result(sample, 1.5)
+    printed = capsys.readouterr().out
+    assert "Temperature: 70.50" in printed and "Junction: 1" in printed and "State_CA: 1" in printed
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from cleaned_io import feature_columns
+from shap_attributions import chunk_contributions
+from test_cleaning import golden_outputs
+
+# A booster saved without feature names was trained on the cleaned feature columns in order, so the
+# targets and Source of a cleaned chunk must stay out of its input
+def test_booster_without_feature_names():
+    chunk = pd.read_csv(golden_outputs[100000])
+    model = xgb.train({'max_depth': 3}, xgb.DMatrix(chunk[feature_columns].to_numpy(), label=chunk['Affected_Time']),
+                      num_boost_round=5)
+    assert model.feature_names is None
+
+    contributions = chunk_contributions(model, chunk)
+    assert list(contributions.columns[1:-1]) == [f"SHAP_{feature}" for feature in feature_columns]
+    expected = model.predict(xgb.DMatrix(chunk[feature_columns].to_numpy()))
+    np.testing.assert_allclose(contributions['Prediction'], expected, rtol=1e-5, atol=1e-4)
@@ -0,0 +1,137 @@
+import argparse
+import json
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+import stage_profiler
+from stage_profiler import StageProfiler, NullProfiler, add_profile_args, profiler_from_args, finish_profile
+
+class Clock:
+    """perf_counter stand-in that only moves when a test advances it"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(stage_profiler.time, 'perf_counter', clock)
+    return clock
+
+# Two chunks of 100 and 80 rows: read, filter (drops rows), write
+def profile_chunks(clock, memory=None):
+    profiler = StageProfiler(memory)
+    for rows, kept, times in [(100, 90, (1.0, 2.0, 0.5)), (80, 60, (3.0, 1.0, 0.5))]:
+        profiler.start('chunk', rows)
+        for step, seconds, rows_out in zip(['read', 'filter', 'write'], times, [None, kept, None]):
+            clock.now += seconds
+            profiler.mark(step, rows_out)
+    return profiler
+
+def test_mark_records_rows_in_and_out(clock):
+    steps = profile_chunks(clock).steps()
+    assert list(steps['index']) == [1, 1, 1, 2, 2, 2]
+    assert list(steps['seconds']) == [1.0, 2.0, 0.5, 3.0, 1.0, 0.5]
+    assert list(steps['rows_in']) == [100, 100, 90, 80, 80, 60]
+    assert list(steps['rows_out']) == [100, 90, 90, 80, 60, 60]
+    assert steps['peak_memory_mb'].isna().all()
+
+def test_units_and_summary(clock):
+    profiler = profile_chunks(clock)
+    units = profiler.units()
+    assert units[['unit', 'index', 'seconds', 'rows_in', 'rows_out']].to_dict(orient='records') == [
+        {'unit': 'chunk', 'index': 1, 'seconds': 3.5, 'rows_in': 100, 'rows_out': 90},
+        {'unit': 'chunk', 'index': 2, 'seconds': 4.5, 'rows_in': 80, 'rows_out': 60}]
+    summary = profiler.summary()
+    assert list(summary['step']) == ['read', 'filter', 'write']
+    assert list(summary['count']) == [2, 2, 2]
+    assert list(summary['seconds']) == [4.0, 3.0, 1.0]
+    assert list(summary['mean_ms']) == [2000.0, 1500.0, 500.0]
+    assert list(summary['rows_in']) == [180, 180, 150]
+    assert list(summary['rows_out']) == [180, 150, 150]
+    assert list(summary['share_%']) == [50.0, 37.5, 12.5]
+
+def test_units_without_rows(clock):
+    profiler = StageProfiler(None)
+    profiler.start('model')
+    clock.now += 2.0
+    profiler.mark('fit')
+    summary = profiler.summary()
+    assert summary['rows_in'].isna().all() and summary['rows_out'].isna().all()
+    assert list(summary['share_%']) == [100.0]
+
+def test_merge_numbers_worker_units_after_local_ones(clock):
+    profiler = profile_chunks(clock)
+    worker = StageProfiler(None)
+    worker.start('chunk', 50)
+    clock.now += 1.0
+    worker.mark('clean', 40)
+    profiler.merge(worker.records)
+    # The merged unit stays open for the parent's own steps
+    clock.now += 0.25
+    profiler.mark('write')
+    profiler.merge([])
+    steps = profiler.steps()
+    assert list(steps['index']) == [1, 1, 1, 2, 2, 2, 3, 3]
+    assert steps.iloc[-1][['step', 'seconds', 'rows_in', 'rows_out']].tolist() == ['write', 0.25, 40, 40]
+    assert profiler.units().iloc[-1][['seconds', 'rows_in', 'rows_out']].tolist() == [1.25, 50, 40]
+
+def test_memory_measures():
+    rss = StageProfiler('rss')
+    rss.start('chunk')
+    rss.mark('read')
+    assert rss.records[0]['peak_memory_mb'] > 0
+    traced = StageProfiler('tracemalloc')
+    try:
+        traced.start('chunk')
+        block = np.ones(2**22)
+        del block
+        traced.mark('allocate')
+        traced.mark('idle')
+    finally:
+        tracemalloc.stop()
+    assert traced.records[0]['peak_memory_mb'] >= 32
+    assert traced.records[1]['peak_memory_mb'] < 32
+    with pytest.raises(ValueError):
+        StageProfiler('heap')
+
+def test_null_profiler_does_nothing():
+    profiler = NullProfiler()
+    profiler.start('chunk', 10)
+    profiler.mark('read', 5)
+    profiler.merge([{'unit': 'chunk'}])
+    assert vars(profiler) == {}
+
+def test_write_report(clock, tmp_path, capsys):
+    profiler = profile_chunks(clock)
+    path = str(tmp_path / 'profiles' / 'cleaning_profile')
+    profiler.write_report(path)
+    steps = pd.read_csv(path + ".csv")
+    assert list(steps.columns) == stage_profiler.record_columns and len(steps) == 6
+    with open(path + ".json") as file:
+        report = json.load(file)
+    assert report['memory'] is None
+    assert [unit['seconds'] for unit in report['units']] == [3.5, 4.5]
+    assert [step['share_%'] for step in report['summary']] == [50.0, 37.5, 12.5]
+    assert report['summary'][0]['peak_memory_mb'] is None and len(report['steps']) == 6
+    profiler.print_summary()
+    assert "2 x chunk: 4.00 seconds on average, slowest chunk 2 at 4.50 seconds" in capsys.readouterr().out
+
+def test_profile_args(tmp_path, capsys):
+    parser = argparse.ArgumentParser()
+    add_profile_args(parser, 'default_profile')
+    assert isinstance(profiler_from_args(parser.parse_args([])), NullProfiler)
+    finish_profile(NullProfiler(), parser.parse_args([]))
+    report = str(tmp_path / 'run')
+    args = parser.parse_args(['--profile', '--profile-memory', 'none', '--profile-report', report])
+    profiler = profiler_from_args(args)
+    assert isinstance(profiler, StageProfiler) and profiler.memory is None
+    profiler.start('chunk', 3)
+    profiler.mark('read')
+    finish_profile(profiler, args)
+    assert (tmp_path / 'run.json').exists() and (tmp_path / 'run.csv').exists()
+    assert f"Profile written to {report}.json and {report}.csv" in capsys.readouterr().out
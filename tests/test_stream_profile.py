@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+from stream_profile import HyperLogLog, QuantileSample, ColumnProfile, DatasetProfile
+from sample_preview import profile_file
+from test_cleaning import golden_outputs
+
+# Profile of a CSV read in chunks of the given size, the way sample_preview.py reads the cleaned data
+def chunked_profile(path, chunk_size):
+    profile = DatasetProfile()
+    start = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        profile.update(chunk, start)
+        start += len(chunk)
+    return profile
+
+def test_same_value_of_int_and_float_chunks_counts_once():
+    sketch = HyperLogLog()
+    sketch.update(pd.Series([0, 1, 1], dtype=np.int64))
+    sketch.update(pd.Series([1.0, 0.0, -0.0]))
+    sketch.update(pd.Series([True, False]))
+    assert sketch.estimate() == 2
+
+def test_distinct_count_does_not_depend_on_chunking():
+    values = pd.Series(np.random.default_rng(0).integers(0, 50000, 200000))
+    whole = HyperLogLog()
+    whole.update(values)
+    merged = HyperLogLog()
+    for start in range(0, len(values), 7000):
+        part = HyperLogLog()
+        part.update(values[start:start + 7000])
+        merged.merge(part)
+    np.testing.assert_array_equal(merged.registers, whole.registers)
+    assert merged.estimate() == whole.estimate()
+    assert abs(whole.estimate() - values.nunique()) < 0.03 * values.nunique()
+
+def test_few_distinct_values_are_counted_exactly():
+    values = pd.Series(np.round(np.random.default_rng(1).uniform(0, 100, 5000), 1))
+    sketch = HyperLogLog()
+    sketch.update(values)
+    assert sketch.estimate() == values.nunique()
+
+# The golden output read in chunks of 3 has chunks whose 0/1 and float columns read as int64
+def test_unique_counts_of_chunked_golden_output_are_exact():
+    path = golden_outputs[3]
+    exact = pd.read_csv(path).nunique()
+    pd.testing.assert_series_equal(chunked_profile(path, 3).unique_counts(), exact, check_names=False)
+
+def test_bottom_k_sample_does_not_depend_on_merge_order():
+    values = np.random.default_rng(2).normal(size=30000)
+    in_order = QuantileSample(size=1000)
+    parts = []
+    for start in range(0, len(values), 5000):
+        in_order.update(values[start:start + 5000], np.random.default_rng(start))
+        part = QuantileSample(size=1000)
+        part.update(values[start:start + 5000], np.random.default_rng(start))
+        parts.append(part)
+    merged = QuantileSample(size=1000)
+    for part in reversed(parts):
+        merged.merge(part)
+    assert len(in_order.values) == 1000
+    np.testing.assert_array_equal(np.sort(merged.values), np.sort(in_order.values))
+    assert abs(in_order.quantiles([0.5])[0]) < 0.15
+
+def test_small_stream_is_kept_whole():
+    sample = QuantileSample(size=100)
+    sample.update(np.arange(11.0), np.random.default_rng(0))
+    assert sample.quantiles([0.0, 0.5, 1.0]) == [0.0, 5.0, 10.0]
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 600])
+def test_merged_moments_match_numpy(chunk_size):
+    values = pd.Series(np.random.default_rng(3).exponential(10.0, 600))
+    values[::7] = np.nan
+    profile = ColumnProfile('numeric')
+    for start in range(0, len(values), chunk_size):
+        part = ColumnProfile('numeric')
+        part.update(values[start:start + chunk_size], np.random.default_rng(start))
+        profile.merge(part)
+    present = values.dropna()
+    assert profile.count == len(present) and profile.nulls == values.isna().sum()
+    assert profile.mean == pytest.approx(present.mean(), rel=1e-12)
+    assert profile.std() == pytest.approx(present.std(), rel=1e-10)
+    assert (profile.min, profile.max) == (present.min(), present.max())
+
+def test_report_does_not_depend_on_chunk_size():
+    path = golden_outputs[100000]
+    one_chunk = profile_file(path, chunk_size=100000)
+    small_chunks = profile_file(path, chunk_size=7)
+    pd.testing.assert_frame_equal(small_chunks.missing(), one_chunk.missing())
+    pd.testing.assert_series_equal(small_chunks.unique_counts(), one_chunk.unique_counts())
+    numeric = ['count', 'mean', 'std', 'min', 'max']
+    pd.testing.assert_frame_equal(small_chunks.describe_numeric().loc[numeric],
+                                  one_chunk.describe_numeric().loc[numeric])
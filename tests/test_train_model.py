@@ -0,0 +1,25 @@
+import optuna
+import pytest
+from train_model import check_study_data, finished_trials, tune_hyperparameters
+
+def make_finished_study(storage, name, data_fingerprint, n_trials):
+    study = optuna.create_study(direction='minimize', storage=storage, study_name=name)
+    check_study_data(study, data_fingerprint)
+    study.optimize(lambda trial: trial.suggest_float('max_depth', 0, 1), n_trials=n_trials)
+    return study
+
+# A study tuned on other data is refused instead of being resumed
+def test_study_of_other_data_is_refused():
+    study = make_finished_study(None, None, "old data", 2)
+    check_study_data(study, "old data")
+    with pytest.raises(ValueError):
+        check_study_data(study, "new data")
+
+# A study that already has its n_trials finished trials returns its best parameters without running another
+def test_finished_study_runs_no_extra_trial(tmp_path):
+    storage = f"sqlite:///{tmp_path / 'study.db'}"
+    make_finished_study(storage, "done", "data", 2)
+    best_params = tune_hyperparameters(None, n_trials=2, training_params={}, storage=storage, study_name="done",
+                                       data_fingerprint="data")
+    assert finished_trials(optuna.load_study(study_name="done", storage=storage)) == 2
+    assert set(best_params) == {'max_depth'}
@@ -0,0 +1,23 @@
+import numpy as np
+import xgboost as xgb
+from compiled_model import CompiledModel
+from tree_maximizer import TreeMaximizer
+
+# A booster trained on a bare matrix stores no feature names and dumps its splits as f0, f1, ...
+def train_unnamed_booster(n_features=4):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 1, (200, n_features)).astype(np.float32)
+    y = X[:, 0] + 2 * X[:, 2]
+    model = xgb.train({'max_depth': 3}, xgb.DMatrix(X, label=y), num_boost_round=5)
+    return model, X
+
+def test_unnamed_booster_is_parsed_by_position():
+    model, X = train_unnamed_booster()
+    assert model.feature_names is None
+    feature_names = ['a', 'b', 'c', 'd']
+
+    compiled = CompiledModel(model, feature_names)
+    np.testing.assert_allclose(compiled.predict(X), model.predict(xgb.DMatrix(X)), rtol=1e-5)
+
+    maximizer = TreeMaximizer(model, feature_names, {name: (0.0, 1.0) for name in feature_names}, [], {})
+    assert abs(maximizer.evaluate(X[0]) - float(model.predict(xgb.DMatrix(X[:1]))[0])) < 1e-5
@@ -0,0 +1,60 @@
+import argparse
+import time
+import xgboost as xgb
+from cleaned_io import read_cleaned, feature_columns
+from train_model import build_cv_data, cross_validate, device_params
+
+# Times Optuna-style tuning trials with per-trial DMatrix construction (xgb.cv) against
+# the shared QuantileDMatrix folds used by train_model.tune_hyperparameters
+
+def trial_params(trial, training_params):
+    # A fixed spread of parameters so both variants train the same models
+    return {
+        'objective': 'reg:squarederror',
+        **training_params,
+        'eval_metric': 'rmse',
+        'max_depth': 3 + trial % 8,
+        'learning_rate': 0.05 + 0.05 * (trial % 5),
+        'subsample': 0.8,
+        'colsample_bytree': 0.8
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare per-trial DMatrix rebuilding with cached folds.")
+    parser.add_argument('--trials', type=int, default=5, help="Trials timed for each variant")
+    parser.add_argument('--rounds', type=int, default=100, help="Maximum boosting rounds per trial")
+    parser.add_argument('--rows', type=int, default=None, help="Only use the first N rows of the cleaned data")
+    parser.add_argument('--device', choices=['auto', 'cpu', 'cuda'], default='auto', help="XGBoost device for both variants")
+    parser.add_argument('--nthread', type=int, default=None, help="CPU threads (defaults to all cores)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    training_params = device_params(args.device, args.nthread)
+    data = read_cleaned(columns=feature_columns + ["Affected_Time"], nrows=args.rows)
+    X = data[feature_columns]
+    y = data["Affected_Time"]
+
+    # Old path: every trial builds its own DMatrix and xgb.cv re-quantizes every fold
+    start_time = time.time()
+    for trial in range(args.trials):
+        dmatrix = xgb.DMatrix(X, label=y, nthread=training_params.get('nthread'))
+        xgb.cv(params=trial_params(trial, training_params), dtrain=dmatrix, num_boost_round=args.rounds, nfold=5,
+               early_stopping_rounds=10, metrics='rmse', as_pandas=True, seed=0)
+    rebuild_time = time.time() - start_time
+
+    # New path: quantize once, then every trial reuses the same fold matrices
+    start_time = time.time()
+    dtrain, folds = build_cv_data(X, y, nthread=training_params.get('nthread'))
+    setup_time = time.time() - start_time
+    for trial in range(args.trials):
+        cross_validate(trial_params(trial, training_params), folds, num_boost_round=args.rounds, early_stopping_rounds=10)
+    cached_time = time.time() - start_time
+
+    print(f"Rebuilt DMatrix per trial: {rebuild_time:.2f} seconds ({rebuild_time / args.trials:.2f} s/trial)")
+    print(f"Cached QuantileDMatrix folds: {cached_time:.2f} seconds (setup {setup_time:.2f} s, "
+          f"{(cached_time - setup_time) / args.trials:.2f} s/trial)")
+    print(f"Speedup: {rebuild_time / cached_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
 import xgboost as xgb
+import numpy as np
 import pandas as pd
+import os
+import json
+import argparse
+import warnings
+import multiprocessing
 from sklearn.model_selection import KFold
 import matplotlib.pyplot as plt
 import optuna
+from cleaned_io import (read_cleaned, iter_cleaned, feature_columns, has_current_feature_store, open_feature_store,
+                        cleaned_fingerprint)
+from stage_profiler import NullProfiler, add_profile_args, profiler_from_args, finish_profile
 
 # Save model to file
 def save_model(model, model_filename):
@@ -17,13 +26,115 @@ def save_feature_importances(model, importance_filename):
     importance_df.to_csv(importance_filename, index=False)
     print(f"Feature importances saved to {importance_filename}")
 
-# Hyperparameter tuning function
-def tune_hyperparameters(X, y, n_trials=50):
+# Pick 'cuda' when XGBoost was built with CUDA and a GPU is usable, otherwise 'cpu'
+def detect_device():
+    if not xgb.build_info().get('USE_CUDA', False):
+        return 'cpu'
+    try:
+        probe = xgb.DMatrix(np.zeros((2, 1)), label=np.zeros(2))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            booster = xgb.train({'tree_method': 'hist', 'device': 'cuda', 'verbosity': 0}, probe, num_boost_round=1)
+    except xgb.core.XGBoostError:
+        return 'cpu'
+    # Without a visible GPU XGBoost falls back to the CPU and records that in its config
+    return json.loads(booster.save_config())['learner']['generic_param']['device']
+
+# Device, thread and histogram settings shared by every training call
+def device_params(device='auto', nthread=None, max_bin=256):
+    if device == 'auto':
+        device = detect_device()
+    params = {'tree_method': 'hist', 'device': device, 'max_bin': max_bin}
+    if device == 'cpu':
+        params['nthread'] = nthread or os.cpu_count()
+    return params
+
+# Build the quantized training matrix once, plus a train/test pair per CV fold that shares its quantile cuts
+def build_cv_data(X, y, n_splits=5, seed=0, max_bin=256, nthread=None):
+    dtrain = xgb.QuantileDMatrix(X, label=y, max_bin=max_bin, nthread=nthread)
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    folds = []
+    for train_index, test_index in kf.split(X):
+        fold_train = xgb.QuantileDMatrix(X.iloc[train_index], label=y.iloc[train_index], ref=dtrain,
+                                         max_bin=max_bin, nthread=nthread)
+        fold_test = xgb.QuantileDMatrix(X.iloc[test_index], label=y.iloc[test_index], ref=dtrain,
+                                        max_bin=max_bin, nthread=nthread)
+        folds.append((fold_train, fold_test))
+    return dtrain, folds
+
+# Cross-validation over prebuilt folds with early stopping on the mean test RMSE, like xgb.cv
+def cross_validate(params, folds, num_boost_round=1000, early_stopping_rounds=10, trial=None):
+    boosters = [xgb.Booster(params, [fold_train, fold_test]) for fold_train, fold_test in folds]
+    history = []
+    best_round, best_rmse = 0, float('inf')
+    for i in range(num_boost_round):
+        train_rmse, test_rmse = [], []
+        for booster, (fold_train, fold_test) in zip(boosters, folds):
+            booster.update(fold_train, i)
+            # The evaluation string looks like "[i]\ttrain-rmse:...\ttest-rmse:..."
+            evaluation = booster.eval_set([(fold_train, 'train'), (fold_test, 'test')], i)
+            scores = dict(item.split(':') for item in evaluation.split('\t')[1:])
+            train_rmse.append(float(scores['train-rmse']))
+            test_rmse.append(float(scores['test-rmse']))
+        history.append({
+            'train-rmse-mean': np.mean(train_rmse), 'train-rmse-std': np.std(train_rmse),
+            'test-rmse-mean': np.mean(test_rmse), 'test-rmse-std': np.std(test_rmse)
+        })
+
+        # Let Optuna stop trials whose intermediate CV RMSE is clearly losing
+        if trial is not None:
+            trial.report(history[-1]['test-rmse-mean'], i)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+
+        if history[-1]['test-rmse-mean'] < best_rmse:
+            best_round, best_rmse = i, history[-1]['test-rmse-mean']
+        elif i - best_round >= early_stopping_rounds:
+            break
+    return pd.DataFrame(history[:best_round + 1])
+
+# Streams the cleaned dataset into XGBoost chunk by chunk, so the raw rows never sit in memory at once
+class CleanedDataIter(xgb.DataIter):
+    def __init__(self, path=None, chunk_size=500000, cache_prefix=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = iter_cleaned(feature_columns + ["Affected_Time"], self.path, self.chunk_size)
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        input_data(data=chunk[feature_columns], label=chunk["Affected_Time"])
+        return True
+
+    def reset(self):
+        self._chunks = None
+
+# Build the training matrix from the iterator: quantized in memory, or paged to disk with external memory
+def build_streamed_matrix(data_iter, max_bin=256, nthread=None, external_memory=False):
+    if external_memory:
+        return xgb.ExtMemQuantileDMatrix(data_iter, max_bin=max_bin, nthread=nthread)
+    return xgb.QuantileDMatrix(data_iter, max_bin=max_bin, nthread=nthread)
+
+# Load the features and the 'Affected_Time' target from the feature store when the last cleaning run wrote it,
+# otherwise the cleaned dataset
+def load_training_data():
+    # The memory-mapped feature store needs no parsing; the DataFrame wraps the mapped matrix without a copy
+    if has_current_feature_store():
+        features, targets, header = open_feature_store()
+        return pd.DataFrame(features, columns=header['feature_columns'], copy=False), pd.Series(targets["Affected_Time"])
+    data = read_cleaned(columns=feature_columns + ["Affected_Time"])
+    return data[feature_columns], data["Affected_Time"]
+
+# Optuna objective running a pruned cross-validation over prebuilt folds
+def make_objective(folds, training_params):
     def objective(trial):
         params = {
             'objective': 'reg:squarederror',
-            'tree_method': 'hist',
-            'device': 'cuda',
+            **training_params,
             'eval_metric': 'rmse',
             'max_depth': trial.suggest_int('max_depth', 3, 10),
             'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3),
@@ -33,41 +144,97 @@ def tune_hyperparameters(X, y, n_trials=50):
             'alpha': trial.suggest_float('alpha', 1e-8, 1.0)
         }
         
-        dmatrix = xgb.DMatrix(X, label=y)
-        cv_results = xgb.cv(
-            params=params,
-            dtrain=dmatrix,
-            num_boost_round=1000,
-            nfold=5,
-            early_stopping_rounds=10,
-            metrics='rmse',
-            as_pandas=True,
-            seed=0
-        )
+        cv_results = cross_validate(params, folds, num_boost_round=1000, early_stopping_rounds=10, trial=trial)
+        trial.set_user_attr('num_boost_round', cv_results.shape[0])
         return cv_results['test-rmse-mean'].min()
+    return objective
+
+# Optuna storage; SQLite studies keep a heartbeat so trials of a killed run are retried on resume
+def make_storage(storage):
+    if storage is None or not storage.startswith('sqlite'):
+        return storage
+    # The heartbeat options are still marked experimental
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', optuna.exceptions.ExperimentalWarning)
+        return optuna.storages.RDBStorage(
+            storage, engine_kwargs={'connect_args': {'timeout': 60}}, heartbeat_interval=60,
+            heartbeat_stale_trial_callback=optuna.storages.RetryHeartbeatStaleTrialCallback()
+        )
+
+def make_pruner():
+    return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=20)
+
+# Trials that count towards the study's n_trials, including those of earlier runs
+finished_states = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+
+# Stop every worker once the study holds n_trials finished trials
+def trial_limit(n_trials):
+    return optuna.study.MaxTrialsCallback(n_trials, states=finished_states)
+
+def finished_trials(study):
+    return len(study.get_trials(deepcopy=False, states=finished_states))
+
+# Default study name: one study per version of the cleaned data, so a rerun after the data changed tunes afresh
+# and only an interrupted run on the same data resumes
+def data_study_name(data_fingerprint):
+    return f"affected_time-{data_fingerprint[:16]}"
+
+# Refuse a study tuned on other data than the current cleaned dataset; a new study is stamped with the data
+def check_study_data(study, data_fingerprint):
+    tuned_on = study.user_attrs.get('data_fingerprint')
+    if tuned_on is None and finished_trials(study) == 0:
+        study.set_user_attr('data_fingerprint', data_fingerprint)
+    elif tuned_on != data_fingerprint:
+        raise ValueError(f"Study {study.study_name} was tuned on other data than the current cleaned dataset; "
+                         f"use another --study-name or leave it out to use the study of the current data")
+
+# Extra tuning process: loads and quantizes the data itself, then joins the shared study
+def _tune_worker(study_name, storage, n_trials, training_params, n_splits, max_bin):
+    X, y = load_training_data()
+    _, folds = build_cv_data(X, y, n_splits, max_bin=max_bin, nthread=training_params.get('nthread'))
+    study = optuna.load_study(study_name=study_name, storage=make_storage(storage), pruner=make_pruner())
+    # MaxTrialsCallback only stops after a trial, so a finished study would still run one more
+    if finished_trials(study) < n_trials:
+        study.optimize(make_objective(folds, training_params), callbacks=[trial_limit(n_trials)])
+
+# Hyperparameter tuning function
+def tune_hyperparameters(folds, n_trials=50, training_params=None, storage=None, study_name=None,
+                         n_jobs=1, n_splits=5, data_fingerprint=None):
+    if training_params is None:
+        training_params = device_params()
+    if n_jobs > 1 and storage is None:
+        raise ValueError("Parallel tuning needs a shared storage such as 'sqlite:///optuna_study.db'")
+    
+    # An existing study with the same name and storage is resumed, if it was tuned on the same data
+    study = optuna.create_study(direction='minimize', storage=make_storage(storage), study_name=study_name,
+                                load_if_exists=True, pruner=make_pruner())
+    if data_fingerprint is not None:
+        check_study_data(study, data_fingerprint)
+    if finished_trials(study) >= n_trials:
+        print(f"Study {study.study_name} already has {n_trials} finished trials")
+        print("Best hyperparameters:", study.best_params)
+        return study.best_params
+    
+    # The other n_jobs - 1 processes are spawned so none of them inherits XGBoost's threads
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_tune_worker,
+                               args=(study_name, storage, n_trials, training_params, n_splits,
+                                     training_params.get('max_bin', 256)))
+               for _ in range(n_jobs - 1)]
+    for worker in workers:
+        worker.start()
+    study.optimize(make_objective(folds, training_params), callbacks=[trial_limit(n_trials)])
+    for worker in workers:
+        worker.join()
     
-    study = optuna.create_study(direction='minimize')
-    study.optimize(objective, n_trials=n_trials)
     print("Best hyperparameters:", study.best_params)
     return study.best_params
 
 # Training function with early stopping
-def train_model(X, y, params, n_splits=5, num_boost_round=1000, early_stopping_rounds=10):
-    kf = KFold(n_splits=n_splits, shuffle=True, random_state=0)
-    dmatrix = xgb.DMatrix(X, label=y)
+def train_model(dtrain, folds, params, num_boost_round=1000, early_stopping_rounds=10):
+    cv_results = cross_validate(params, folds, num_boost_round, early_stopping_rounds)
     
-    cv_results = xgb.cv(
-        params=params,
-        dtrain=dmatrix,
-        num_boost_round=num_boost_round,
-        folds=kf,
-        early_stopping_rounds=early_stopping_rounds,
-        metrics='rmse',
-        as_pandas=True,
-        seed=0
-    )
-    
-    model = xgb.train(params, dmatrix, num_boost_round=cv_results.shape[0])
+    model = xgb.train(params, dtrain, num_boost_round=cv_results.shape[0])
     return model, cv_results
 
 # Feature importance visualization function
@@ -80,30 +247,101 @@ def plot_feature_importance(model):
     importance_df.plot(kind='bar', x='Feature', y='Importance', title='Feature Importances')
     plt.show()
 
+# Command line options for a training run
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tune and train the XGBoost model on the cleaned dataset.")
+    parser.add_argument('--device', choices=['auto', 'cpu', 'cuda'], default='auto',
+                        help="Training device; auto uses a GPU when one is available")
+    parser.add_argument('--nthread', type=int, default=None,
+                        help="CPU threads for quantization and training (defaults to all cores)")
+    parser.add_argument('--max-bin', type=int, default=256, help="Histogram bins per feature")
+    parser.add_argument('--n-trials', type=int, default=50, help="Finished tuning trials the study should reach")
+    parser.add_argument('--n-jobs', type=int, default=1, help="Processes running tuning trials in parallel")
+    parser.add_argument('--storage', default='sqlite:///optuna_study.db',
+                        help="Optuna storage URL; an interrupted study resumes from it")
+    parser.add_argument('--study-name', default=None,
+                        help="Name of the Optuna study (defaults to one named after a hash of the cleaned data)")
+    parser.add_argument('--full', action='store_true',
+                        help="Skip tuning and train on the whole cleaned dataset with the study's best parameters")
+    parser.add_argument('--chunk-size', type=int, default=500000, help="Rows streamed per chunk with --full")
+    parser.add_argument('--external-memory', action='store_true',
+                        help="With --full, page the quantized matrix to disk instead of keeping it in memory")
+    add_profile_args(parser, "training_profile")
+    return parser.parse_args()
+
+# Train on the whole cleaned dataset by streaming it, using the best trial of an earlier tuning run
+def train_full(args, training_params, profiler=None):
+    if profiler is None:
+        profiler = NullProfiler()
+    profiler.start('train full')
+    data_fingerprint = cleaned_fingerprint()
+    study = optuna.load_study(study_name=args.study_name or data_study_name(data_fingerprint),
+                              storage=make_storage(args.storage))
+    check_study_data(study, data_fingerprint)
+    params = {'objective': 'reg:squarederror', **study.best_params, **training_params, 'eval_metric': 'rmse'}
+    num_boost_round = study.best_trial.user_attrs.get('num_boost_round', 1000)
+    
+    cache_prefix = os.path.join('.', 'xgb_cache') if args.external_memory else None
+    data_iter = CleanedDataIter(chunk_size=args.chunk_size, cache_prefix=cache_prefix)
+    dtrain = build_streamed_matrix(data_iter, args.max_bin, training_params.get('nthread'), args.external_memory)
+    print(f"Training on {dtrain.num_row()} rows for {num_boost_round} rounds")
+    profiler.mark('Stream and quantize data', dtrain.num_row())
+    
+    model = xgb.train(params, dtrain, num_boost_round=num_boost_round)
+    profiler.mark('Train')
+    save_model(model, "best_model_distance.xgb")
+    save_feature_importances(model, "feature_importances_distance.csv")
+    profiler.mark('Save model')
+
 # Main function
 def main():
+    args = parse_args()
+    profiler = profiler_from_args(args)
+    training_params = device_params(args.device, args.nthread, args.max_bin)
+    print(f"Training on {training_params['device']}")
+    
+    if args.full:
+        train_full(args, training_params, profiler)
+        finish_profile(profiler, args)
+        return
+    
     # Hyperparameters and other constants
     n_splits = 5
     num_boost_round = 1000
     early_stopping_rounds = 10
     
     # Load data
-    data = pd.read_csv("us_accidents_sample_cleaned.csv")
-    X = data.drop(columns=["Affected_Time", "Affected_Distance", "Source"])
-    y = data["Affected_Time"]
+    profiler.start('train')
+    X, y = load_training_data()
+    profiler.mark('Load data', len(X))
+    
+    # Quantize the data and materialize the folds once for every trial and the final fit
+    dtrain, folds = build_cv_data(X, y, n_splits, max_bin=args.max_bin, nthread=training_params.get('nthread'))
+    profiler.mark('Quantize folds')
     
-    # Tune hyperparameters
-    tuned_params = tune_hyperparameters(X, y)
-    tuned_params.update({'tree_method': 'hist', 'device': 'cuda', 'eval_metric': 'rmse'})
+    # Tune hyperparameters; parallel trial processes split the CPU threads between them
+    tuning_params = dict(training_params)
+    if 'nthread' in tuning_params:
+        tuning_params['nthread'] = max(1, tuning_params['nthread'] // args.n_jobs)
+    data_fingerprint = cleaned_fingerprint()
+    study_name = args.study_name or data_study_name(data_fingerprint)
+    tuned_params = tune_hyperparameters(folds, args.n_trials, tuning_params, storage=args.storage,
+                                        study_name=study_name, n_jobs=args.n_jobs, n_splits=n_splits,
+                                        data_fingerprint=data_fingerprint)
+    tuned_params.update({**training_params, 'eval_metric': 'rmse'})
+    profiler.mark('Tune hyperparameters')
     
     # Train model
-    model, cv_results = train_model(X, y, tuned_params, n_splits, num_boost_round, early_stopping_rounds)
+    model, cv_results = train_model(dtrain, folds, tuned_params, num_boost_round, early_stopping_rounds)
+    profiler.mark('Cross-validate and train')
     
     # Save the model and feature importances
     model_filename = "best_model_distance.xgb"
     feature_importance_filename = "feature_importances_distance.csv"
     save_model(model, model_filename)
     save_feature_importances(model, feature_importance_filename)
+    profiler.mark('Save model')
+    finish_profile(profiler, args)
 
     # Display cross-validation results and feature importance
     print("Cross-validation results:")
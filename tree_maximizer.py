@@ -0,0 +1,219 @@
+import heapq
+import json
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import xgboost as xgb
+
+# Read the booster's base score; predictions are base_score + sum of the reached leaves
+def get_base_score(model: xgb.Booster) -> float:
+    config = json.loads(model.save_config())
+    return float(config['learner']['learner_model_param']['base_score'].strip('[]'))
+
+# Parse the JSON dump of every tree into flat node lists
+def parse_trees(model: xgb.Booster, feature_names: List[str]) -> List[Dict[str, list]]:
+    if model.feature_names is None:
+        # A booster without stored names dumps its splits on f0, f1, ..., the columns of feature_names in order
+        feature_index = {f"f{i}": i for i in range(len(feature_names))}
+    else:
+        feature_index = {feature: i for i, feature in enumerate(feature_names)}
+    trees = []
+    for dump in model.get_dump(dump_format='json'):
+        nodes = {}
+        stack = [json.loads(dump)]
+        while stack:
+            node = stack.pop()
+            nodes[node['nodeid']] = node
+            stack.extend(node.get('children', []))
+
+        # Node i of the flat tree is the node with nodeid i; leaves have feature -1
+        size = max(nodes) + 1
+        tree = {'feature': [-1] * size, 'threshold': [0.0] * size, 'yes': [-1] * size,
+                'no': [-1] * size, 'missing': [-1] * size, 'leaf': [0.0] * size}
+        for node_id, node in nodes.items():
+            if 'leaf' in node:
+                tree['leaf'][node_id] = float(node['leaf'])
+            else:
+                tree['feature'][node_id] = feature_index[node['split']]
+                tree['threshold'][node_id] = float(np.float32(node['split_condition']))
+                tree['yes'][node_id] = node['yes']
+                tree['no'][node_id] = node['no']
+                tree['missing'][node_id] = node['missing']
+        trees.append(tree)
+    return trees
+
+class TreeMaximizer:
+    """Branch-and-bound search for the input that maximizes a tree ensemble's prediction.
+
+    Every feature becomes a search variable. A continuous feature is cut into cells by the split
+    thresholds that fall inside its range, and a boolean feature has the cells 0 and 1. Features
+    without a constraint are fixed at 0, and each one-hot group is a single variable choosing one
+    member. A region holds a cell interval per cell variable and an allowed-member bitmask per group.
+    Its upper bound is the base score plus each tree's largest leaf reachable inside the region.
+    """
+
+    def __init__(self, model: xgb.Booster, feature_names: List[str],
+                 continuous_ranges: Dict[str, Tuple[float, float]], boolean_features: List[str],
+                 categorical_groups: Dict[str, List[str]]):
+        self.feature_names = feature_names
+        self.base_score = get_base_score(model)
+        self.trees = parse_trees(model, feature_names)
+        feature_index = {feature: i for i, feature in enumerate(feature_names)}
+
+        # Split thresholds used on every feature
+        thresholds = [set() for _ in feature_names]
+        for tree in self.trees:
+            for feature, threshold in zip(tree['feature'], tree['threshold']):
+                if feature >= 0:
+                    thresholds[feature].add(threshold)
+
+        # Cell variables: the sorted start value of every cell; groups: the feature index of every member
+        self.cell_starts = []
+        self.groups = []
+        self.feature_var = [None] * len(feature_names)
+        grouped = {feature for features in categorical_groups.values() for feature in features}
+        for i, feature in enumerate(feature_names):
+            if feature in grouped:
+                continue
+            if feature in continuous_ranges:
+                low, high = continuous_ranges[feature]
+                grid = sorted(t for t in thresholds[i] if low < t <= high)
+                starts = [float(np.float32(low))] + grid
+            elif feature in boolean_features:
+                starts = [0.0, 1.0]
+            else:
+                starts = [0.0]
+            self.feature_var[i] = ('cell', len(self.cell_starts), None)
+            self.cell_starts.append(np.array(starts))
+        for features in categorical_groups.values():
+            members = [feature_index[feature] for feature in features if feature in feature_index]
+            for position, i in enumerate(members):
+                self.feature_var[i] = ('group', len(self.groups), position)
+            self.groups.append(members)
+
+        # Cut of every split node: cells below the cut go to 'yes' (x < threshold), the others to 'no'
+        for tree in self.trees:
+            tree['cut'] = [0] * len(tree['feature'])
+            for node, feature in enumerate(tree['feature']):
+                if feature >= 0 and self.feature_var[feature][0] == 'cell':
+                    starts = self.cell_starts[self.feature_var[feature][1]]
+                    tree['cut'][node] = int(np.searchsorted(starts, tree['threshold'][node], side='left'))
+
+    def full_region(self) -> Tuple[tuple, tuple]:
+        """The region of all feasible inputs"""
+        cells = tuple((0, len(starts) - 1) for starts in self.cell_starts)
+        masks = tuple((1 << len(members)) - 1 for members in self.groups)
+        return cells, masks
+
+    def _reachable(self, tree: Dict[str, list], node: int, region: Tuple[tuple, tuple]) -> Tuple[bool, bool]:
+        cells, masks = region
+        kind, var, position = self.feature_var[tree['feature'][node]]
+        if kind == 'cell':
+            low, high = cells[var]
+            cut = tree['cut'][node]
+            return low < cut, high >= cut
+
+        # A group member is 1 when chosen and 0 when another member is chosen
+        threshold = tree['threshold'][node]
+        chosen = bool(masks[var] & (1 << position))
+        other = bool(masks[var] & ~(1 << position))
+        return (other and 0 < threshold) or (chosen and 1 < threshold), \
+               (other and 0 >= threshold) or (chosen and 1 >= threshold)
+
+    def _bound_tree(self, tree: Dict[str, list], node: int, region: Tuple[tuple, tuple]):
+        # Returns (max leaf, min leaf, first ambiguous node on the path to the max leaf)
+        if tree['feature'][node] < 0:
+            return tree['leaf'][node], tree['leaf'][node], None
+        go_yes, go_no = self._reachable(tree, node, region)
+        if go_yes and go_no:
+            yes_max, yes_min, _ = self._bound_tree(tree, tree['yes'][node], region)
+            no_max, no_min, _ = self._bound_tree(tree, tree['no'][node], region)
+            return max(yes_max, no_max), min(yes_min, no_min), node
+        return self._bound_tree(tree, tree['yes'][node] if go_yes else tree['no'][node], region)
+
+    def bound(self, region: Tuple[tuple, tuple]) -> Tuple[float, Optional[Tuple[int, int]]]:
+        """Upper bound of the region and the split that best narrows it (None once the region is exact)"""
+        upper = self.base_score
+        widest, split = 0.0, None
+        for tree_index, tree in enumerate(self.trees):
+            tree_max, tree_min, node = self._bound_tree(tree, 0, region)
+            upper += tree_max
+            if tree_max - tree_min > widest:
+                widest, split = tree_max - tree_min, (tree_index, node)
+        return upper, split
+
+    def split_region(self, region: Tuple[tuple, tuple], split: Tuple[int, int]) -> List[Tuple[tuple, tuple]]:
+        """Split a region in two along the variable of an ambiguous node"""
+        tree = self.trees[split[0]]
+        node = split[1]
+        cells, masks = region
+        kind, var, position = self.feature_var[tree['feature'][node]]
+        if kind == 'cell':
+            low, high = cells[var]
+            cut = tree['cut'][node]
+            return [(cells[:var] + ((low, cut - 1),) + cells[var + 1:], masks),
+                    (cells[:var] + ((cut, high),) + cells[var + 1:], masks)]
+        return [(cells, masks[:var] + (masks[var] & ~(1 << position),) + masks[var + 1:]),
+                (cells, masks[:var] + (masks[var] & (1 << position),) + masks[var + 1:])]
+
+    def point(self, region: Tuple[tuple, tuple]) -> np.ndarray:
+        """A feasible input inside the region: the first cell's start and the first allowed member"""
+        cells, masks = region
+        x = np.zeros(len(self.feature_names), dtype=np.float32)
+        for i, (kind, var, position) in enumerate(self.feature_var):
+            if kind == 'cell':
+                x[i] = self.cell_starts[var][cells[var][0]]
+            elif masks[var] & -masks[var] == 1 << position:
+                x[i] = 1
+        return x
+
+    def evaluate(self, x: np.ndarray) -> float:
+        """Prediction for a single input, summed over the parsed trees"""
+        total = self.base_score
+        for tree in self.trees:
+            node = 0
+            while tree['feature'][node] >= 0:
+                node = tree['yes'][node] if x[tree['feature'][node]] < tree['threshold'][node] else tree['no'][node]
+            total += tree['leaf'][node]
+        return total
+
+    def maximize(self, max_nodes: int = 100000, tolerance: float = 1e-6,
+                 log_every: int = 10000) -> Tuple[np.ndarray, float, float]:
+        """Best-first branch and bound; returns (best input, its prediction, proven upper bound)"""
+        region = self.full_region()
+        upper, split = self.bound(region)
+        best_x = self.point(region)
+        best_value = self.evaluate(best_x)
+        if split is None:
+            return best_x, best_value, best_value
+
+        # Max-heap of open regions by upper bound; the counter keeps pops deterministic
+        heap = [(-upper, 0, region, split)]
+        counter = 1
+        explored = 0
+        while heap and explored < max_nodes:
+            neg_upper, _, region, split = heapq.heappop(heap)
+            if -neg_upper <= best_value + tolerance * max(1.0, abs(best_value)):
+                heap = []
+                break
+            explored += 1
+
+            for child in self.split_region(region, split):
+                child_upper, child_split = self.bound(child)
+                if child_split is None:
+                    # The prediction is constant on the child, so its bound is attained by any point in it
+                    if child_upper > best_value:
+                        best_x, best_value = self.point(child), child_upper
+                elif child_upper > best_value:
+                    # Any point of the child is feasible, so it may raise the incumbent as well
+                    child_x = self.point(child)
+                    child_value = self.evaluate(child_x)
+                    if child_value > best_value:
+                        best_x, best_value = child_x, child_value
+                    heapq.heappush(heap, (-child_upper, counter, child, child_split))
+                    counter += 1
+
+            if log_every and explored % log_every == 0:
+                print(f"Explored {explored} regions. Best: {best_value}, upper bound: {-heap[0][0] if heap else best_value}")
+
+        upper_bound = max(best_value, -heap[0][0]) if heap else best_value
+        return best_x, best_value, upper_bound
@@ -3,6 +3,8 @@ import seaborn as sns
 from matplotlib import pyplot as plt
 import numpy as np
 import random
-from sample_preview import data
+
+# Load the cleaned CSV file
+data = pd.read_csv("us_accidents_cleaned.csv")
 
 data
\ No newline at end of file
@@ -1,52 +1,14 @@
-import pandas as pd
+from aggregate_cube import load_or_build_cube
 
-# Load the CSV file into a DataFrame
-file_path = 'us_accidents_sample_cleaned.csv'
-df = pd.read_csv(file_path)
+# Cleaning maps every Wind_Direction into one of the WindDir_* categories (or none, 'NA'),
+# so the counts per direction come from the aggregate cube (built on first use)
+value_counts = load_or_build_cube().rollup(['WindDir'])['Count']
 
-# Mapping of wind directions to the new categories
-wind_direction_map = {
-    'N': 'N', 
-    'North': 'N', 
-    'NW': 'N', 
-    'NNE': 'N', 
-    'NNW': 'N', 
-
-    'E': 'E', 
-    'East': 'E',
-    'NE': 'E', 
-    'ENE': 'E', 
-    'ESE': 'E', 
-
-    'S': 'S', 
-    'South': 'S', 
-    'SE': 'S', 
-    'SSE': 'S', 
-    'SSW': 'S', 
-
-    'W': 'W', 
-    'West': 'W',
-    'SW': 'W', 
-    'WNW': 'W', 
-    'WSW': 'W', 
-
-    'CALM': 'Calm', 
-    'Calm': 'Calm', 
-
-    'VAR': 'Variable', 
-    'Variable': 'Variable',
-
-    None: 'NA'
-}
-
-# Apply the mapping to the 'Wind_Direction' column
-df['Wind_Direction'] = df['Wind_Direction'].map(wind_direction_map)
-
-# Get the unique values in the 'Wind_Direction' column and sort them alphabetically
-unique_values = sorted(df['Wind_Direction'].dropna().unique())
+# Get the unique directions and sort them alphabetically
+unique_values = sorted(value for value in value_counts.index if value != 'NA')
 
 # Count of NA (missing) values
-na_count = df['Wind_Direction'].isna().sum()
+na_count = value_counts.get('NA', 0)
 
 # Print the unique values
 print("Unique values for 'Wind_Direction':")
@@ -60,5 +22,4 @@ print("\nCount of each unique value:")
 print(f"NA: {na_count}")
 
 for value in unique_values:
-    count = df['Wind_Direction'].value_counts().get(value, 0)
-    print(f"{value}: {count}")
+    print(f"{value}: {value_counts[value]}")